@@ -1,18 +1,40 @@
- import os
-import pygame, sys, math, itertools, random
+import time
+_IMPORT_START = time.perf_counter()
+import os
+import pygame, sys, math, itertools, random, heapq
 import io  # Needed for sound buffer
+import struct
+import json
+import gc
+import collections
+import contextlib
+import atexit
+import weakref
+import threading
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-# --- Sound Engine Initialization ---
-pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
-pygame.init()
-pygame.mixer.init()  # Initialize the mixer after pre_init
+# Importing this module is side-effect free: pygame, sounds, tile images and
+# generated worlds are all set up by startup(), which the menu and the game
+# call on first use. Each step is timed into STARTUP_TIMES.
+STARTUP_TIMES = []
+_STARTED = False
 
 # --- Constants ---
 WIDTH, HEIGHT = 800, 600
 TILE = 32
 FPS = 60
 GRAVITY = 0.55
-SCROLL_EDGE = WIDTH // 3
+JUMP_VEL = -10
+RUN_SPEED = 4
+GAME_VIEW = (WIDTH // 2, HEIGHT // 2)  # the game's backbuffer, scaled up to the window
+VIEW_SCALE = GAME_VIEW[0] / WIDTH  # backbuffer px per world px; the view still spans WIDTH x HEIGHT
+VIEW_TILE = round(TILE * VIEW_SCALE)  # tile art size in the backbuffer
+CAMERA_DEADZONE = (1/4, 1/3, 1/3, 2/3)  # left, top, right, bottom as fractions of the view
+CAMERA_SMOOTHING = 0.2  # fraction of the remaining distance covered per tick
 
 # --- NSMB2-inspired color palette ---
 PAL = {
@@ -31,7 +53,12 @@ PAL = {
     "black": (0, 0, 0),
     "brick": (155, 118, 83),
     "player": (234, 92, 68),
-    "flag": (255, 255, 255)
+    "flag": (255, 255, 255),
+    "goomba": (150, 90, 50),
+    "koopa": (80, 180, 90),
+    "breakable": (200, 120, 70),
+    "question": (250, 190, 40),
+    "used_block": (120, 90, 60)
 }
 
 # --- Sound Generation (OST Style) ---
@@ -51,37 +78,40 @@ def generate_tone(frequency, duration_ms, volume=0.2):
         stereo_buf += sample_bytes + sample_bytes
     return pygame.mixer.Sound(buffer=stereo_buf)
 
-try:
-    SFX_HOVER = generate_tone(660, 100)
-    SFX_CLICK = generate_tone(440, 120)
-    SFX_COIN_SOUND = generate_tone(1320, 120)
-    SFX_JUMP_SOUND = generate_tone(880, 120)
-
-    def create_simple_ost():
-        notes = [261.63, 329.63, 392.00, 523.25, 659.25, 783.99, 1046.50, 1318.51]
-        note_duration = 150
-        music_buffer = bytearray()
-        sample_rate = 22050
-        max_amplitude = int(32767 * 0.15)
-        for freq in notes:
-            n_samples = int(round(note_duration * sample_rate / 1000.0))
-            for i in range(n_samples):
-                t = float(i) / sample_rate
-                wave = math.sin(2.0 * math.pi * freq * t)
-                value = int(wave * max_amplitude)
-                music_buffer += value.to_bytes(2, byteorder='little', signed=True)
-        stereo_music_buffer = bytearray()
-        for i in range(0, len(music_buffer), 2):
-            sample_bytes = music_buffer[i:i+2]
-            stereo_music_buffer += sample_bytes + sample_bytes
-        sound = pygame.mixer.Sound(buffer=stereo_music_buffer)
-        sound.set_volume(0.5)
-        return sound
-
-    OST_THEME = create_simple_ost()
-except Exception as e:
-    print(f"Warning: Error generating sounds: {e}")
-    SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
+def create_simple_ost():
+    notes = [261.63, 329.63, 392.00, 523.25, 659.25, 783.99, 1046.50, 1318.51]
+    note_duration = 150
+    music_buffer = bytearray()
+    sample_rate = 22050
+    max_amplitude = int(32767 * 0.15)
+    for freq in notes:
+        n_samples = int(round(note_duration * sample_rate / 1000.0))
+        for i in range(n_samples):
+            t = float(i) / sample_rate
+            wave = math.sin(2.0 * math.pi * freq * t)
+            value = int(wave * max_amplitude)
+            music_buffer += value.to_bytes(2, byteorder='little', signed=True)
+    stereo_music_buffer = bytearray()
+    for i in range(0, len(music_buffer), 2):
+        sample_bytes = music_buffer[i:i+2]
+        stereo_music_buffer += sample_bytes + sample_bytes
+    sound = pygame.mixer.Sound(buffer=stereo_music_buffer)
+    sound.set_volume(0.5)
+    return sound
+
+SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
+
+def load_sounds():
+    global SFX_HOVER, SFX_CLICK, SFX_COIN_SOUND, SFX_JUMP_SOUND, OST_THEME
+    try:
+        SFX_HOVER = ASSETS.acquire("tone", 660, 100)
+        SFX_CLICK = ASSETS.acquire("tone", 440, 120)
+        SFX_COIN_SOUND = ASSETS.acquire("tone", 1320, 120)
+        SFX_JUMP_SOUND = ASSETS.acquire("tone", 880, 120)
+        OST_THEME = ASSETS.acquire("ost")
+    except Exception as e:
+        print(f"Warning: Error generating sounds: {e}")
+        SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
 
 # --- Graphics Helpers ---
 def solid(color, w=TILE, h=TILE):
@@ -89,11 +119,6 @@ def solid(color, w=TILE, h=TILE):
     surf.fill(color)
     return surf
 
-def create_tile(color, w=32, h=32):
-    surf = pygame.Surface((w, h))
-    surf.fill(color)
-    return surf
-
 def create_cloud():
     cloud = pygame.Surface((100, 60), pygame.SRCALPHA)
     pygame.draw.circle(cloud, PAL["cloud_blue"], (20, 30), 20)
@@ -114,27 +139,40 @@ def create_coin():
     pygame.draw.circle(coin, (255, 220, 40), (12, 12), 8)
     return coin
 
-def create_mario_icon():
-    mario = pygame.Surface((40, 50), pygame.SRCALPHA)
-    pygame.draw.rect(mario, PAL["mario_red"], (10, 5, 20, 10))
-    pygame.draw.rect(mario, PAL["mario_red"], (5, 10, 30, 5))
-    pygame.draw.rect(mario, (255, 200, 180), (12, 15, 16, 15))
-    pygame.draw.circle(mario, PAL["black"], (17, 20), 2)
-    pygame.draw.circle(mario, PAL["black"], (23, 20), 2)
-    pygame.draw.rect(mario, PAL["black"], (15, 23, 10, 3))
-    pygame.draw.rect(mario, PAL["mario_blue"], (12, 30, 16, 20))
-    pygame.draw.rect(mario, PAL["mario_blue"], (8, 35, 8, 10))
-    pygame.draw.rect(mario, PAL["mario_blue"], (24, 35, 8, 10))
-    pygame.draw.circle(mario, (40, 80, 180), (17, 35), 2)
-    pygame.draw.circle(mario, (40, 80, 180), (23, 35), 2)
-    return mario
-
-def draw_text(text, size, color, x, y, center=True):
+def load_font(size):
     try:
-        font = pygame.font.SysFont('Arial', size, bold=True)
+        return pygame.font.SysFont('Arial', size, bold=True)
     except:
-        font = pygame.font.Font(None, size)
-    text_surface = font.render(text, True, color)
+        return pygame.font.Font(None, size)
+
+def render_text(text, size, color):
+    return ASSETS.get("font", size).render(text, True, color)
+
+def create_button(w, h):
+    # shadow, face and outline of a menu button, offset 3px for the shadow
+    surf = pygame.Surface((w + 3, h + 3), pygame.SRCALPHA)
+    pygame.draw.rect(surf, PAL["button_shadow"], (3, 3, w, h), border_radius=10)
+    pygame.draw.rect(surf, PAL["button_yellow"], (0, 0, w, h), border_radius=10)
+    pygame.draw.rect(surf, PAL["text_brown"], (0, 0, w, h), 3, border_radius=10)
+    return surf
+
+def create_menu_ground():
+    # the top edge lines are thicker than 1px, so keep 2px of headroom
+    surf = pygame.Surface((WIDTH, 34), pygame.SRCALPHA)
+    surf.fill(PAL["dirt_brown"], (0, 2, WIDTH, 32))
+    for i in range(WIDTH // 32 + 1):
+        pygame.draw.line(surf, (120, 80, 50), (i * 32, 2), (i * 32 + 32, 2), 2)
+    for i in range(0, WIDTH // 32 + 1, 2):
+        pygame.draw.line(surf, PAL["grass_green"], (i * 32, 2), (i * 32 + 32, 2), 3)
+    return surf
+
+def create_dot(color, radius):
+    surf = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(surf, color, (radius, radius), radius)
+    return surf
+
+def draw_text(text, size, color, x, y, center=True):
+    text_surface = ASSETS.get("text", text, size, color)
     text_rect = text_surface.get_rect()
     if center:
         text_rect.center = (x, y)
@@ -142,14 +180,240 @@ def draw_text(text, size, color, x, y, center=True):
         text_rect.topleft = (x, y)
     return text_surface, text_rect
 
-# --- Game Data ---
-IMG = {
-    "#": solid(PAL["brick"]),
-    "G": solid(PAL["grass_green"]),
-    "C": solid(PAL["coin_yellow"]),
-    "F": solid(PAL["flag"]),
+# --- Sprite Animation ---
+# Every pose of a character is drawn once, side by side, into a strip; the
+# strip is mirrored once for the left-facing set and both are pre-sliced into
+# subsurfaces. Animating is then just picking a frame index.
+MARIO_POSES = ("idle", "run0", "run1", "run2", "jump")
+ANIMATIONS = {"idle": (0,), "run": (1, 2, 3, 2), "jump": (4,)}
+ANIM_FRAME_TICKS = 6
+
+def _draw_mario(surf, ox, pose):
+    def rect(color, r):
+        pygame.draw.rect(surf, color, (r[0] + ox, r[1], r[2], r[3]))
+    def circle(color, c, radius):
+        pygame.draw.circle(surf, color, (c[0] + ox, c[1]), radius)
+    rect(PAL["mario_red"], (10, 5, 20, 10))
+    rect(PAL["mario_red"], (5, 10, 30, 5) if pose == "idle" else (10, 10, 28, 5))
+    rect((255, 200, 180), (12, 15, 16, 15))
+    eye = 0 if pose == "idle" else 2
+    circle(PAL["black"], (17 + eye, 20), 2)
+    circle(PAL["black"], (23 + eye, 20), 2)
+    rect(PAL["black"], (15 + eye, 23, 10, 3))
+    if pose == "idle":
+        rect(PAL["mario_blue"], (12, 30, 16, 20))
+    else:
+        rect(PAL["mario_blue"], (12, 30, 16, 12))
+        legs = {"run0": ((8, 40), (22, 38)), "run1": ((14, 40), (16, 40)),
+                "run2": ((20, 40), (11, 38)), "jump": ((8, 38), (24, 36))}[pose]
+        for lx, ly in legs:
+            rect(PAL["mario_blue"], (lx, ly, 8, 50 - ly))
+    rect(PAL["mario_blue"], (8, 35, 8, 10))
+    rect(PAL["mario_blue"], (24, 22, 8, 10) if pose == "jump" else (24, 35, 8, 10))
+    circle((40, 80, 180), (17, 35), 2)
+    circle((40, 80, 180), (23, 35), 2)
+
+class FrameStrip:
+    """A character's poses baked into one strip plus its mirror image."""
+    __slots__ = ("strip", "flipped", "frames")
+    def __init__(self, strip, count):
+        w, h = strip.get_width() // count, strip.get_height()
+        self.strip = strip
+        self.flipped = pygame.transform.flip(strip, True, False)
+        self.frames = {
+            1: [strip.subsurface((i * w, 0, w, h)) for i in range(count)],
+            -1: [self.flipped.subsurface(((count - 1 - i) * w, 0, w, h)) for i in range(count)],
+        }
+    def get(self, anim, facing, tick):
+        seq = ANIMATIONS[anim]
+        return self.frames[facing][seq[(tick // ANIM_FRAME_TICKS) % len(seq)]]
+
+def _build_mario_frames(size=None):
+    n = len(MARIO_POSES)
+    if size is None:
+        surf = pygame.Surface((40 * n, 50), pygame.SRCALPHA)
+        for i, pose in enumerate(MARIO_POSES):
+            _draw_mario(surf, i * 40, pose)
+    else:
+        w, h = size
+        scale = min(w / 40, h / 50)
+        fw, fh = int(40 * scale), int(50 * scale)
+        scaled = pygame.transform.scale(mario_frames().strip, (fw * n, fh))
+        surf = pygame.Surface((w * n, h), pygame.SRCALPHA)
+        for i in range(n):
+            surf.blit(scaled, (i * w + (w - fw) // 2, h - fh), (i * fw, 0, fw, fh))
+    return FrameStrip(surf, n)
+
+def mario_frames(size=None):
+    """Cached Mario strip: the 40x50 menu art, or fitted into `size` cells."""
+    return ASSETS.get("mario", size)
+
+# --- Parallax Background ---
+class ParallaxLayer:
+    """A pre-rendered, horizontally tileable strip scrolled at `factor`."""
+    __slots__ = ("strip", "factor", "width")
+    def __init__(self, strip, factor):
+        if pygame.display.get_surface():
+            strip = strip.convert_alpha()
+        self.strip = strip
+        self.factor = factor
+        self.width = strip.get_width()
+    def draw(self, screen, camera, bottom):
+        # the strip is at least a screen wide, so two blits always cover it;
+        # it is built at VIEW_SCALE, `bottom` is in world px
+        s = VIEW_SCALE * self.factor
+        ox = int(camera.x * s) % self.width
+        y = int(bottom * VIEW_SCALE) - self.strip.get_height() - int(camera.y * s)
+        screen.blit(self.strip, (-ox, y))
+        if self.width - ox < screen.get_width():
+            screen.blit(self.strip, (self.width - ox, y))
+
+def _tiled_strip(art, count, width, height, rng, y_range):
+    strip = pygame.Surface((width, height), pygame.SRCALPHA)
+    aw = art.get_width()
+    for _ in range(count):
+        x, y = rng.randrange(width), rng.randint(*y_range)
+        strip.blit(art, (x, y))
+        if x + aw > width:  # wrap so the seam is invisible
+            strip.blit(art, (x - width, y))
+    return strip
+
+def _build_parallax(scale=1):
+    rng = random.Random(7)
+    width = WIDTH + 400
+    layers = ((_tiled_strip(ASSETS.get("mountain"), 5, width, 150, rng, (0, 0)), 0.2),
+              (_tiled_strip(ASSETS.get("cloud"), 6, width, 260, rng, (0, 120)), 0.4))
+    return [ParallaxLayer(strip if scale == 1 else pygame.transform.smoothscale(
+                strip, (round(strip.get_width() * scale), round(strip.get_height() * scale))), factor)
+            for strip, factor in layers]
+
+# --- Assets ---
+# Every surface or sound is built through ASSETS from a builder name and its
+# arguments, so identical requests share one object. acquire/release count
+# holders; assets nobody holds stay cached until the resident total passes
+# the budget, then the least recently used of them are dropped first.
+ASSET_BUDGET = 32 << 20  # bytes
+ASSET_BUILDERS = {
+    "solid": solid,
+    "cloud": create_cloud,
+    "mountain": create_mountain,
+    "coin": create_coin,
+    "button": create_button,
+    "menu_ground": create_menu_ground,
+    "dot": create_dot,
+    "font": load_font,
+    "text": render_text,
+    "mario": _build_mario_frames,
+    "parallax": _build_parallax,
+    "tone": generate_tone,
+    "ost": create_simple_ost,
 }
 
+def asset_bytes(asset):
+    if isinstance(asset, pygame.Surface):
+        return asset.get_width() * asset.get_height() * asset.get_bytesize()
+    if isinstance(asset, pygame.mixer.Sound):
+        return len(asset.get_raw())
+    if isinstance(asset, FrameStrip):
+        return asset_bytes(asset.strip) + asset_bytes(asset.flipped)
+    if isinstance(asset, ParallaxLayer):
+        return asset_bytes(asset.strip)
+    if isinstance(asset, (list, tuple)):
+        return sum(map(asset_bytes, asset))
+    return 0
+
+def asset_surfaces(asset):
+    if isinstance(asset, pygame.Surface):
+        return [asset]
+    if isinstance(asset, FrameStrip):
+        return [asset.strip, asset.flipped]
+    if isinstance(asset, ParallaxLayer):
+        return [asset.strip]
+    if isinstance(asset, (list, tuple)):
+        return [s for a in asset for s in asset_surfaces(a)]
+    return []
+
+class AssetManager:
+    __slots__ = ("builders", "budget", "assets", "sizes", "refs", "idle", "resident",
+                 "builds", "hits", "evictions")
+    def __init__(self, builders=ASSET_BUILDERS, budget=ASSET_BUDGET):
+        self.builders = builders
+        self.budget = budget
+        self.assets = {}
+        self.sizes = {}
+        self.refs = {}
+        self.idle = collections.OrderedDict()  # unreferenced keys, oldest first
+        self.resident = 0
+        self.builds = self.hits = self.evictions = 0
+    def get(self, name, *args):
+        """The asset, built on first use; does not keep it alive."""
+        key = (name,) + args
+        asset = self.assets.get(key)
+        if asset is None:
+            asset = self.assets[key] = self.builders[name](*args)
+            size = self.sizes[key] = asset_bytes(asset)
+            self.resident += size
+            self.builds += 1
+            if not self.refs.get(key):
+                self.idle[key] = None
+            self.trim()
+        else:
+            self.hits += 1
+            if key in self.idle:
+                self.idle.move_to_end(key)
+        return asset
+    def acquire(self, name, *args):
+        asset = self.get(name, *args)
+        key = (name,) + args
+        self.refs[key] = self.refs.get(key, 0) + 1
+        self.idle.pop(key, None)
+        return asset
+    def release(self, name, *args):
+        key = (name,) + args
+        refs = self.refs[key] - 1
+        if refs:
+            self.refs[key] = refs
+            return
+        del self.refs[key]
+        if key in self.assets:
+            self.idle[key] = None
+            self.trim()
+    def trim(self):
+        while self.resident > self.budget and self.idle:
+            key, _ = self.idle.popitem(last=False)
+            del self.assets[key]
+            self.resident -= self.sizes.pop(key)
+            self.evictions += 1
+    def report(self):
+        lines = [f"{'asset':<32}{'refs':>5}{'KiB':>9}"]
+        for key in sorted(self.assets, key=lambda k: -self.sizes[k]):
+            name = key[0] + (f"({', '.join(map(repr, key[1:]))})" if key[1:] else "")
+            lines.append(f"{name[:32]:<32}{self.refs.get(key, 0):>5}{self.sizes[key] / 1024:>9.1f}")
+        lines.append(f"resident {self.resident / 1024:.1f} KiB of {self.budget / 1024:.0f} KiB budget; "
+                     f"{self.builds} built, {self.hits} reused, {self.evictions} evicted")
+        return "\n".join(lines)
+
+ASSETS = AssetManager()
+
+# --- Game Data ---
+IMG = []  # sprite per tile id, filled by startup()
+ENEMY_SPRITES = {}  # sprite per enemy kind id, filled by startup()
+
+def load_tiles():
+    IMG[:] = [ASSETS.acquire("solid", PAL[color], VIEW_TILE, VIEW_TILE) if color else None
+              for color in TILE_SPRITES]
+    ENEMY_SPRITES.update((kind, ASSETS.acquire(*key)) for kind, key in ENEMY_ASSETS.items())
+
+def convert_sprites():
+    """Copy the startup sprites into the window's pixel format.
+
+    load_tiles runs before any display mode is set, when surfaces can't be
+    converted yet, so the software Display calls this once its window exists.
+    """
+    IMG[:] = [img.convert() if img else None for img in IMG]
+    for kind, img in ENEMY_SPRITES.items():
+        ENEMY_SPRITES[kind] = img.convert()
+
 WORLD_DATA = [
   [  # world 1
     [
@@ -160,7 +424,7 @@ WORLD_DATA = [
       "............C...................................................",
       "########.............................#####......................",
       "................................................................",
-      "................................................................",
+      "....................E.......................K...................",
       "################################################################"
     ],
     [
@@ -169,7 +433,7 @@ WORLD_DATA = [
       "..........####......................#####...............................",
       "........................................................................",
       "...............#####....................................................",
-      "..........................................#####........................",
+      ".........................E................#####........................",
       "#######################################################################"
     ],
     [
@@ -177,45 +441,992 @@ WORLD_DATA = [
       ".............C...............................................###.......",
       "........##########....................................................",
       ".....................................................#####............",
-      "......................#####.................................C..........",
+      "......................#####........E........................C..........",
       "#######################################################################"
     ],
   ],
 ]
 
-def auto_worlds(base_worlds, worlds=5, levels_each=3, length=60):
+# --- Tiles ---
+# Levels are authored as strings, but each character is translated once into
+# a small integer id, and what a tile does is read from flat per-id tables
+# (TILE_FLAGS[id] & T_SOLID, BLOCKS_SIDE[id], TILE_SPRITES[id]) instead of
+# comparing characters. Id 0 is air; unknown characters become air.
+T_SOLID, T_ONE_WAY, T_HAZARD, T_COLLECT, T_GOAL, T_SPAWN, T_BREAK, T_BONUS = (
+    1, 2, 4, 8, 16, 32, 64, 128)
+TILE_TYPES = (  # (char, name, flags, sprite colour); the index is the id
+    (".", "air", 0, None),
+    ("#", "brick", T_SOLID, "brick"),
+    ("G", "ground", T_SOLID, "grass_green"),
+    ("-", "platform", T_ONE_WAY, "dirt_brown"),
+    ("^", "spikes", T_HAZARD, "mario_red"),
+    ("B", "breakable", T_SOLID | T_BREAK, "breakable"),
+    ("?", "question", T_SOLID | T_BONUS, "question"),
+    ("U", "used", T_SOLID, "used_block"),
+    ("C", "coin", T_COLLECT, "coin_yellow"),
+    ("F", "flag", T_GOAL, "flag"),
+    ("E", "goomba", T_SPAWN, None),
+    ("K", "koopa", T_SPAWN, None),
+    ("S", "start", 0, None),  # the player's spawn point; otherwise air
+)
+TILE_CHARS = "".join(t[0] for t in TILE_TYPES)
+TILE_IDS = {ch: i for i, ch in enumerate(TILE_CHARS)}
+TILE_FLAGS = bytes(t[2] for t in TILE_TYPES)
+TILE_SPRITES = tuple(t[3] for t in TILE_TYPES)
+AIR, COIN_TILE, FLAG_TILE, USED_TILE = TILE_IDS["."], TILE_IDS["C"], TILE_IDS["F"], TILE_IDS["U"]
+START_TILE = TILE_IDS["S"]
+
+def tiles_with(mask):
+    return [i for i, f in enumerate(TILE_FLAGS) if f & mask]
+
+def _flag_table(mask):
+    return bytes(1 if f & mask else 0 for f in TILE_FLAGS)
+
+BLOCKS_SIDE = _flag_table(T_SOLID)  # stops moves sideways and upwards
+BLOCKS_DOWN = _flag_table(T_SOLID | T_ONE_WAY)  # stops falls
+IS_GOAL = _flag_table(T_GOAL)
+IS_DRAWN = bytes(1 if t[3] and not t[2] & (T_COLLECT | T_GOAL) else 0 for t in TILE_TYPES)
+_TILE_CODES = bytearray(256)
+for _i, _ch in enumerate(TILE_CHARS):
+    _TILE_CODES[ord(_ch)] = _i
+_TILE_CODES = bytes(_TILE_CODES)  # unknown characters read as empty
+
+def tile_row(row):
+    """A level row string as bytes of tile ids."""
+    if not row.isascii():  # as ".", not "?" (the bonus block) as "replace" would
+        row = "".join(ch if ch.isascii() else "." for ch in row)
+    return row.encode("ascii").translate(_TILE_CODES)
+
+# --- Tile Collision ---
+# Swept, one axis at a time, over a level stored as columns of tile ids
+# (cols[c][r]). Only the tile columns/rows the leading edge enters are
+# tested, so fast bodies can't tunnel through one-tile walls and the cost
+# grows with the distance moved, not the level size. One-way tiles only
+# stop a fall whose bottom edge enters them from above. Positions may be
+# floats. `tile` is the tile size in the caller's position units (see Body).
+def _ceil_div(v, tile=TILE):
+    return -int(-v // tile)
+
+def sweep_x(cols, h, x, y, w, bh, dx, tile=TILE):
+    """Slide a w x bh box at (x, y) by dx; returns (x, blocked)."""
+    if not dx:
+        return x, False
+    r0, r1 = max(int(y // tile), 0), min(_ceil_div(y + bh, tile), h)
+    if dx > 0:
+        first, stop, step = _ceil_div(x + w, tile), _ceil_div(x + w + dx, tile), 1
+    else:
+        first, stop, step = int(x // tile) - 1, int((x + dx) // tile) - 1, -1
+    n = len(cols)
+    for c in range(first, stop, step):
+        if 0 <= c < n:
+            col = cols[c]
+            for r in range(r0, r1):
+                if BLOCKS_SIDE[col[r]]:
+                    return (c * tile - w if dx > 0 else (c + 1) * tile), True
+    return x + dx, False
+
+def sweep_y(cols, h, x, y, w, bh, dy, tile=TILE):
+    """Slide a w x bh box at (x, y) by dy; returns (y, blocked)."""
+    if not dy:
+        return y, False
+    c0, c1 = max(int(x // tile), 0), min(_ceil_div(x + w, tile), len(cols))
+    if dy > 0:
+        first, stop, step = _ceil_div(y + bh, tile), _ceil_div(y + bh + dy, tile), 1
+        blocks = BLOCKS_DOWN
+    else:
+        first, stop, step = int(y // tile) - 1, int((y + dy) // tile) - 1, -1
+        blocks = BLOCKS_SIDE
+    for r in range(first, stop, step):
+        if 0 <= r < h:
+            for c in range(c0, c1):
+                if blocks[cols[c][r]]:
+                    return (r * tile - bh if dy > 0 else (r + 1) * tile), True
+    return y + dy, False
+
+def level_columns(grid):
+    """The grid transposed into equal-length columns of tile ids (bytes)."""
+    w = max(len(row) for row in grid)
+    flat = b"".join(tile_row(row.ljust(w, ".")) for row in grid)
+    return [flat[c::w] for c in range(w)]
+
+def tile_flags_under(cols, h, x, y, w, bh, tile=TILE):
+    """TILE_FLAGS of every cell a w x bh box overlaps, OR-ed together."""
+    flags = 0
+    for c in range(max(int(x // tile), 0), min(_ceil_div(x + w, tile), len(cols))):
+        col = cols[c]
+        for r in range(max(int(y // tile), 0), min(_ceil_div(y + bh, tile), h)):
+            flags |= TILE_FLAGS[col[r]]
+    return flags
+
+# --- Level Analysis ---
+# Offline reachability check. Mirrors Player.update tick for tick on the raw
+# grid, but searches (A* on ticks) over standing positions (tile-aligned
+# column, row), expanding each with a handful of macro moves (walk a tile,
+# jump and hold a direction for N ticks). A move only ever sees the few columns ahead of it,
+# so its outcome is memoized on those columns and repeated terrain across
+# thousands of generated levels is only simulated once. Macro moves can't
+# jump from partway across a tile or turn in the air, so when A* finds no
+# path the level is searched again tick by tick, which is exhaustive.
+IN_LEFT, IN_RIGHT, IN_JUMP = 1, 2, 4
+_REACH = 6  # columns a single move may travel; longer moves are discarded
+_MOVES = [(d, jump, hold) for d in (IN_RIGHT, IN_LEFT)
+          for jump, hold in ((False, None), (True, None), (True, 12), (True, 6))]
+_GOAL = (-1, -1)
+# per-tick search inputs; jumping only matters on the ground
+_GROUND_INPUTS = (IN_RIGHT, IN_RIGHT | IN_JUMP, IN_JUMP, 0, IN_LEFT, IN_LEFT | IN_JUMP)
+_AIR_INPUTS = (IN_RIGHT, 0, IN_LEFT)
+_MOVE_CACHE = {}
+_COLUMN_IDS = {}
+_COLUMN_NAMES = []
+# only tiles that affect movement are kept, so coins don't split the cache
+_INERT = bytes(i if i < len(TILE_FLAGS) and TILE_FLAGS[i] & (T_SOLID | T_ONE_WAY | T_HAZARD | T_GOAL)
+               else 0 for i in range(256))
+_GOAL_IDS, _HAZARD_IDS = tiles_with(T_GOAL), tiles_with(T_HAZARD)
+
+# cells the player may not start in: something to collide with, hurt or trigger
+_SPAWN_BLOCKED = _flag_table(T_SOLID | T_ONE_WAY | T_HAZARD | T_GOAL | T_SPAWN)
+
+def find_spawn(grid, cols=None):
+    """Top-left px the player starts at: the `S` marker if the level has one,
+    else the lowest free cell with ground under it and a free cell above it,
+    in the leftmost column that has such a cell. `cols` are the grid's
+    level_columns(), when the caller already has them.
+    """
+    for y, row in enumerate(grid):
+        x = tile_row(row).find(START_TILE)
+        if x >= 0:
+            return x*TILE, y*TILE
+    blocked = _SPAWN_BLOCKED
+    for x, col in enumerate(cols or level_columns(grid)):
+        for y in range(len(col) - 2, -1, -1):
+            if BLOCKS_DOWN[col[y + 1]] and not blocked[col[y]] and not (y and blocked[col[y - 1]]):
+                return x*TILE, y*TILE
+    return TILE*2, HEIGHT-3*TILE
+
+def _round(v):
+    # pygame.Rect rounds float assignments half away from zero
+    return int(v + 0.5) if v >= 0 else -int(-v + 0.5)
+
+def _sim_step(cols, h, x, y, vy, on_ground, inp):
+    """One Player.update tick against a list of column strings."""
+    vx = (((inp >> 1) & 1) - (inp & 1)) * RUN_SPEED
+    if inp & IN_JUMP and on_ground:
+        vy = JUMP_VEL
+    vy += GRAVITY
+    x = sweep_x(cols, h, x, y, TILE, TILE, vx)[0]
+    y, hit = sweep_y(cols, h, x, y, TILE, TILE, vy)
+    on_ground = hit and vy > 0
+    if hit:
+        vy = 0
+    return x, y, vy, on_ground
+
+def _touches_flag(cols, h, x, y):
+    y = _round(y)  # the player's rect is snapped to whole pixels
+    for c in range(max(x // TILE, 0), min((x + TILE - 1) // TILE + 1, len(cols))):
+        col = cols[c]
+        for r in range(max(y // TILE - 1, 0), min((y + TILE - 1) // TILE + 1, h)):
+            if IS_GOAL[col[r]]:
+                return True
+    return False
+
+def _move_inputs(move, ticks, align):
+    d, jump, hold = move
+    inputs = [(d | (IN_JUMP if jump and t == 0 else 0)) if hold is None or t < hold else 0
+              for t in range(ticks)]
+    if align:
+        inputs += [IN_LEFT if align < 0 else IN_RIGHT] * abs(align)
+    return inputs
+
+def _run_move(cols, h, start, row, move):
+    """Simulate a macro move from column `start` of a move window.
+
+    Returns (dx, y, ticks, hit_flag) relative to the start, or None if the
+    player falls out of the level or would leave the window.
+    """
+    x0 = start * TILE
+    x, y, vy, on_ground = x0, row * TILE, 0.0, True
+    d, jump, hold = move
+    flag = any(t in col for t in _GOAL_IDS for col in cols)
+    hazard = any(t in col for t in _HAZARD_IDS for col in cols)
+    airborne = False
+    limit = (len(cols) - 2) * TILE
+    for t in range(8 * TILE):
+        inp = d if hold is None or t < hold else 0
+        if jump and t == 0:
+            inp |= IN_JUMP
+        x, y, vy, on_ground = _sim_step(cols, h, x, y, vy, on_ground, inp)
+        if flag and _touches_flag(cols, h, x, y):
+            return x - x0, y, t + 1, True
+        if y > h * TILE or x < TILE or x > limit:
+            return None
+        if hazard and tile_flags_under(cols, h, x, _round(y), TILE, TILE) & T_HAZARD:
+            return None
+        if not on_ground:
+            airborne = True
+        elif airborne or jump or t >= TILE // RUN_SPEED - 1:
+            return x - x0, int(y), t + 1, False
+    return None
+
+def _expand(cols, h, row, d):
+    """All macro moves in direction `d` from the standing cell of a window.
+
+    Each edge is (move index, column delta, landing row, ticks, align, hit),
+    where `align` is the signed number of walk ticks needed afterwards to get
+    back onto a tile-aligned column that is still over the landing tile.
+    """
+    start = 1 if d == IN_RIGHT else _REACH
+    edges = []
+    for i, move in enumerate(_MOVES):
+        if move[0] != d:
+            continue
+        res = _run_move(cols, h, start, row, move)
+        if res is None:
+            continue
+        dx, y, ticks, hit = res
+        lc, off = divmod(start * TILE + dx, TILE)
+        align = 0
+        if off and not hit:
+            below = y // TILE + 1
+            if below < h and BLOCKS_DOWN[cols[lc][below]]:
+                align = -(off // RUN_SPEED)
+            else:
+                align = (TILE - off) // RUN_SPEED
+                lc += 1
+        if hit or (lc, y // TILE) != (start, row):
+            edges.append((i, lc - start, y // TILE, ticks, align, hit))
+    return tuple(edges)
+
+def _search_ticks(cols, h, x, y, vy, on_ground):
+    """Breadth-first search over single ticks for the fewest inputs to the flag.
+
+    Visits every reachable (x, y, vy, on_ground) state, so it finds paths
+    the macro moves miss, at a much higher cost. Returns None if there are none.
+    """
+    hazard = any(t in col for t in _HAZARD_IDS for col in cols)
+    limit = h * TILE
+    start = (x, y, vy, on_ground)
+    came = {start: None}
+    frontier = [start]
+    while frontier:
+        nxt = []
+        for state in frontier:
+            for inp in _GROUND_INPUTS if state[3] else _AIR_INPUTS:
+                s = _sim_step(cols, h, *state, inp)
+                if s in came:
+                    continue
+                came[s] = (state, inp)
+                x, y = s[0], s[1]
+                if _touches_flag(cols, h, x, y):
+                    path = []
+                    while came[s] is not None:
+                        s, inp = came[s]
+                        path.append(inp)
+                    return path[::-1]
+                if y > limit or (hazard and tile_flags_under(cols, h, x, _round(y), TILE, TILE) & T_HAZARD):
+                    continue
+                nxt.append(s)
+        frontier = nxt
+    return None
+
+def _column_id(s):
+    i = _COLUMN_IDS.get(s)
+    if i is None:
+        i = _COLUMN_IDS[s] = len(_COLUMN_NAMES)
+        _COLUMN_NAMES.append(s)
+    return i
+
+def _column_ids(grid):
+    pad = [_column_id(bytes(len(grid)))] * (_REACH + 1)
+    return pad + [_column_id(col.translate(_INERT)) for col in level_columns(grid)] + pad
+
+def analyze_level(grid, spawn=None):
+    """Return the shortest list of per-tick inputs that reaches the flag.
+
+    Inputs are bitmasks of IN_LEFT/IN_RIGHT/IN_JUMP, replayable through
+    Player.update from `spawn` (defaults to the engine's spawn search).
+    Paths come from the macro-move A* when it finds one (shortest over
+    those moves), else from the exhaustive _search_ticks. Returns None
+    when the flag cannot be reached.
+    """
+    if len(_MOVE_CACHE) > 200000:
+        _MOVE_CACHE.clear()
+        _COLUMN_IDS.clear()
+        del _COLUMN_NAMES[:]
+    h = len(grid)
+    ids = _column_ids(grid)
+    names = _COLUMN_NAMES
+    cols = [names[i] for i in ids]
+    flags = [c for c, col in enumerate(cols) if any(t in col for t in _GOAL_IDS)]
+    if not flags:
+        return None
+    pad = _REACH + 1
+    # let the player settle from the spawn point
+    x, y = spawn if spawn is not None else find_spawn(grid)
+    x += pad * TILE
+    vy, on_ground, inputs = 0.0, False, []
+    while not on_ground:
+        if _touches_flag(cols, h, x, y):
+            return inputs
+        if y > h * TILE or x % TILE:
+            return None
+        x, y, vy, on_ground = _sim_step(cols, h, x, y, vy, on_ground, 0)
+        inputs.append(0)
+    # A*: running speed bounds how fast any flag column can be reached
+    estimate = [max(min(abs(f - c) for f in flags) - 1, 0) * (TILE // RUN_SPEED)
+                for c in range(len(cols))]
+    start = (x // TILE, y // TILE)
+    best = {start: len(inputs)}
+    came = {}
+    heap = [(len(inputs) + estimate[start[0]], len(inputs), start)]
+    lo, hi = pad, len(cols) - pad
+    while heap:
+        _, cost, node = heapq.heappop(heap)
+        if node == _GOAL:
+            path, n = [], node
+            while n != start:
+                n, move, ticks, align = came[n]
+                path.append(_move_inputs(_MOVES[move], ticks, align))
+            return inputs + [i for step in reversed(path) for i in step]
+        if cost > best[node]:
+            continue
+        c, r = node
+        for d in (IN_RIGHT, IN_LEFT):
+            lo_c, hi_c = (c - 1, c + _REACH + 1) if d == IN_RIGHT else (c - _REACH, c + 2)
+            key = (d, r, tuple(ids[lo_c:hi_c]))
+            edges = _MOVE_CACHE.get(key)
+            if edges is None:
+                edges = _MOVE_CACHE[key] = _expand(cols[lo_c:hi_c], h, r, d)
+            for move, dc, nr, ticks, align, hit in edges:
+                nxt = _GOAL if hit else (c + dc, nr)
+                if not hit and not lo <= c + dc < hi:
+                    continue
+                ncost = cost + ticks + abs(align)
+                if ncost < best.get(nxt, ncost + 1):
+                    best[nxt] = ncost
+                    came[nxt] = (node, move, ticks, align)
+                    heapq.heappush(heap, (ncost + (0 if hit else estimate[c + dc]), ncost, nxt))
+    path = _search_ticks(cols, h, x, y, vy, on_ground)
+    return None if path is None else inputs + path
+
+def _random_level(length, rng=random):
+    rows = []
+    for y in range(9):
+        if y == 8:
+            rows.append("#"*length)
+        elif y == 7:
+            row = list("."*length)
+            for i in range(rng.randint(3, 7)):
+                pos = rng.randint(0, length-4)
+                width = rng.randint(3, 8)
+                for j in range(width):
+                    if pos+j < length:
+                        row[pos+j] = "#"
+            rows.append("".join(row))
+        else:
+            row = list("."*length)
+            if rng.random() < 0.4:
+                for i in range(rng.randint(2, 5)):
+                    pos = rng.randint(0, length-1)
+                    row[pos] = "C"
+            rows.append("".join(row))
+    flag_row = list(rows[7])
+    flag_row[-2] = "F"
+    rows[7] = "".join(flag_row)
+    return rows
+
+AUTO_ATTEMPTS = 50  # generated candidates per level before giving up
+
+def auto_worlds(base_worlds, worlds=5, levels_each=3, length=60, validate=True):
     while len(base_worlds) < worlds:
         w = []
         for _ in range(levels_each):
-            rows = []
-            for y in range(9):
-                if y == 8:
-                    rows.append("#"*length)
-                elif y == 7:
-                    row = list("."*length)
-                    for i in range(random.randint(3, 7)):
-                        pos = random.randint(0, length-4)
-                        width = random.randint(3, 8)
-                        for j in range(width):
-                            if pos+j < length:
-                                row[pos+j] = "#"
-                    rows.append("".join(row))
-                else:
-                    row = list("."*length)
-                    if random.random() < 0.4:
-                        for i in range(random.randint(2, 5)):
-                            pos = random.randint(0, length-1)
-                            row[pos] = "C"
-                    rows.append("".join(row))
-            flag_row = list(rows[7])
-            flag_row[-2] = "F"
-            rows[7] = "".join(flag_row)
+            for attempt in range(AUTO_ATTEMPTS):
+                rows = _random_level(length)
+                if not validate or analyze_level(rows) is not None:
+                    break
+            else:
+                raise RuntimeError(f"no solvable {length}-column level in {AUTO_ATTEMPTS} attempts")
             w.append(rows)
         base_worlds.append(w)
-auto_worlds(WORLD_DATA, worlds=5)
+
+def check_levels(worlds, samples=2000, length=60):
+    ok = True
+    for wi, world in enumerate(worlds):
+        for li, grid in enumerate(world):
+            path = analyze_level(grid)
+            ok = ok and path is not None
+            print(f"W{wi+1}-{li+1}: " + (f"{len(path)} ticks" if path is not None else "UNREACHABLE"))
+    levels = [_random_level(length) for _ in range(samples)]
+    start = time.perf_counter()
+    solved = sum(analyze_level(grid) is not None for grid in levels)
+    elapsed = time.perf_counter() - start
+    print(f"{solved}/{samples} generated levels solvable, {samples/elapsed:.0f} levels/s")
+    return ok
+
+# --- Startup ---
+@contextlib.contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMES.append((name, time.perf_counter() - start))
+
+def startup(audio=True):
+    """Run the expensive one-time setup; later calls do nothing."""
+    global _STARTED
+    if _STARTED:
+        return
+    _STARTED = True
+    with startup_phase("pygame.init"):
+        if audio:
+            pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
+            pygame.init()
+            pygame.mixer.init()  # Initialize the mixer after pre_init
+        else:
+            pygame.display.init()
+    if audio:
+        with startup_phase("sounds"):
+            load_sounds()
+    with startup_phase("tiles"):
+        load_tiles()
+    with startup_phase("worlds"):
+        auto_worlds(WORLD_DATA, worlds=5)
+
+def startup_report():
+    total = sum(t for _, t in STARTUP_TIMES)
+    for name, t in STARTUP_TIMES:
+        print(f"{name:<14}{t*1000:9.1f} ms")
+    print(f"{'total':<14}{total*1000:9.1f} ms")
+
+# --- Display ---
+WINDOW_SIZE = (WIDTH, HEIGHT)  # set by --window
+FULLSCREEN = False  # set by --fullscreen
+RENDERER = "software"  # set by --renderer
+
+class Display:
+    """The window. Scenes draw into a fixed-size backbuffer from target().
+
+    present() scales it by the largest whole factor that fits (shrinking
+    only if the window is smaller) straight into a cached, centred
+    subsurface of the window, so fill cost follows the backbuffer size and
+    any window size or fullscreen works. When the window already matches,
+    target() returns the window itself and present() does nothing.
+    """
+    def __init__(self, size=None, fullscreen=None):
+        fullscreen = FULLSCREEN if fullscreen is None else fullscreen
+        if fullscreen:
+            self.window = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            self.window = pygame.display.set_mode(size or WINDOW_SIZE, pygame.RESIZABLE)
+        convert_sprites()
+        self.buffers = {}
+        self.layout = None  # (window size, buffer size, dest subsurface, scale, bars)
+
+    def target(self, size):
+        self.window = pygame.display.get_surface()
+        if self.window.get_size() == size:
+            return self.window
+        buf = self.buffers.get(size)
+        if buf is None:
+            buf = self.buffers[size] = pygame.Surface(size).convert()
+        return buf
+
+    def _layout(self, size):
+        win = self.window
+        ws = win.get_size()
+        if self.layout is None or self.layout[:2] != (ws, size):
+            (ww, wh), (bw, bh) = ws, size
+            scale = min(ww / bw, wh / bh)
+            if scale >= 1:
+                scale = int(scale)
+            dw, dh = max(int(bw * scale), 1), max(int(bh * scale), 1)
+            dest = pygame.Rect((ww - dw) // 2, (wh - dh) // 2, dw, dh)
+            bars = [r for r in (pygame.Rect(0, 0, ww, dest.top), pygame.Rect(0, dest.bottom, ww, wh),
+                                pygame.Rect(0, 0, dest.left, wh), pygame.Rect(dest.right, 0, ww, wh))
+                    if r.w > 0 and r.h > 0]
+            self.layout = (ws, size, win.subsurface(dest), scale, bars)
+        return self.layout
+
+    def present(self, buf):
+        if buf is self.window:
+            return
+        _, _, dest, scale, bars = self._layout(buf.get_size())
+        for bar in bars:
+            self.window.fill((0, 0, 0), bar)
+        pygame.transform.scale(buf, dest.get_size(), dest)
+
+    def to_buffer(self, pos, size):
+        """Map a window position (e.g. the mouse) into a backbuffer of `size`."""
+        if self.window.get_size() == size:
+            return pos
+        _, _, dest, scale, _ = self._layout(size)
+        ox, oy = dest.get_abs_offset()
+        return int((pos[0] - ox) / scale), int((pos[1] - oy) / scale)
+
+    def hud(self):
+        """Window-resolution target for overlays drawn after present()."""
+        return self.window
+
+    def read(self, buf):
+        """The finished backbuffer as a Surface (for frame capture)."""
+        return buf
+
+    def warm(self, asset):
+        """Get an asset's surfaces ready to draw; software blits need no upload."""
+
+    def set_caption(self, text):
+        pygame.display.set_caption(text)
+
+    def flip(self):
+        pygame.display.flip()
+
+class TextureCanvas:
+    """The part of the Surface API scenes draw with, as textured quads.
+
+    fill/blit/blits queue copies on the display's Renderer, which SDL
+    batches into as few draw calls as it can. Source surfaces are treated
+    as immutable once drawn: each is uploaded once and looked up by
+    identity, subsurfaces as a region of their parent's texture.
+    """
+    __slots__ = ("display", "renderer", "size")
+    def __init__(self, display, size):
+        self.display = display
+        self.renderer = display.renderer
+        self.size = size
+    def get_size(self):
+        return self.size
+    def get_width(self):
+        return self.size[0]
+    def get_height(self):
+        return self.size[1]
+    def fill(self, color, rect=None):
+        renderer = self.renderer
+        if rect is None:  # a full clear also wipes the letterbox bars
+            renderer.draw_color = (0, 0, 0, 255)
+            renderer.clear()
+            rect = (0, 0, *self.size)
+        renderer.draw_color = pygame.Color(color)
+        renderer.fill_rect(rect)
+    def blit(self, surf, dest, area=None, special_flags=0):
+        tex, ox, oy = self.display.texture(surf)
+        if area is None:
+            w, h = surf.get_size()
+            src = (ox, oy, w, h)
+        else:
+            x, y, w, h = area
+            src = (ox + x, oy + y, w, h)
+        alpha = surf.get_alpha()
+        tex.alpha = 255 if alpha is None else alpha
+        tex.draw(src, (int(dest[0]), int(dest[1]), w, h))
+    def blits(self, seq, doreturn=True):
+        blit = self.blit
+        for item in seq:
+            blit(*item)
+
+class TextureDisplay(Display):
+    """Display on a pygame._sdl2 Renderer instead of the window surface.
+
+    target() returns a TextureCanvas and sets the renderer's logical size,
+    so SDL does the letterboxed scaling when it presents. SDL picks the
+    first renderer that works: OpenGL (Mesa's llvmpipe without a GPU) or
+    its own software renderer.
+    """
+    def __init__(self, size=None, fullscreen=None):
+        from pygame._sdl2 import video
+        self.video = video
+        fullscreen = FULLSCREEN if fullscreen is None else fullscreen
+        self.sdl_window = video.Window("Koopa Engine", size or WINDOW_SIZE,
+                                       resizable=not fullscreen, fullscreen_desktop=fullscreen)
+        self.renderer = video.Renderer(self.sdl_window)
+        self.textures = weakref.WeakKeyDictionary()
+        self.canvases = {}
+        self.logical = None
+        # textures must go before the renderer, or SDL crashes at exit
+        atexit.register(self.close)
+
+    def texture(self, surf):
+        entry = self.textures.get(surf)
+        if entry is None:
+            root = surf.get_abs_parent()
+            if root is surf:
+                entry = (self.video.Texture.from_surface(self.renderer, surf), 0, 0)
+            else:
+                entry = (self.texture(root)[0], *surf.get_abs_offset())
+            self.textures[surf] = entry
+        return entry
+
+    def warm(self, asset):
+        for surf in asset_surfaces(asset):
+            self.texture(surf)
+
+    def target(self, size):
+        if size != self.logical:
+            self.renderer.logical_size = self.logical = size
+        canvas = self.canvases.get(size)
+        if canvas is None:
+            canvas = self.canvases[size] = TextureCanvas(self, size)
+        return canvas
+
+    def present(self, buf):
+        pass
+
+    def to_buffer(self, pos, size):
+        (ww, wh), (bw, bh) = self.sdl_window.size, size
+        scale = min(ww / bw, wh / bh)
+        return int((pos[0] - (ww - bw * scale) / 2) / scale), int((pos[1] - (wh - bh * scale) / 2) / scale)
+
+    def hud(self):
+        return self.target(self.sdl_window.size)
+
+    def read(self, buf):
+        # blocking: to_surface waits for the GPU and copies the window back,
+        # several ms a frame. to_surface reads window pixels, so undo the
+        # logical scaling here
+        (ww, wh), (bw, bh) = self.sdl_window.size, buf.get_size()
+        scale = min(ww / bw, wh / bh)
+        dw, dh = int(bw * scale), int(bh * scale)
+        self.renderer.logical_size = self.logical = (0, 0)
+        shot = self.renderer.to_surface()
+        shot = shot.subsurface(((ww - dw) // 2, (wh - dh) // 2, dw, dh))
+        return pygame.transform.scale(shot, (bw, bh))
+
+    def set_caption(self, text):
+        self.sdl_window.title = text
+
+    def flip(self):
+        self.renderer.present()
+
+    def close(self):
+        self.textures.clear()
+        self.canvases.clear()
+        if self.sdl_window is not None:
+            self.renderer = None
+            self.sdl_window.destroy()
+            self.sdl_window = None
+
+def open_display(size=None, fullscreen=None):
+    """The window for the --renderer backend."""
+    if RENDERER == "sdl2":
+        return TextureDisplay(size, fullscreen)
+    return Display(size, fullscreen)
+
+# --- Frame Profiler ---
+def wait_frame(clock):
+    # kept as its own function so profiles can tell sleeping from working
+    return clock.tick(FPS)
+
+FRAME_STATS_PATH = None  # set by --frame-stats; each scene exports on exit
+PHASE_COLORS = [(230, 80, 80), (240, 160, 60), (240, 220, 80), (120, 200, 80),
+                (80, 190, 200), (90, 120, 230), (170, 100, 220), (220, 120, 180)]
+
+class FrameProfiler:
+    """Per-phase frame timings kept in a fixed-size ring buffer.
+
+    Call begin() at the top of a frame, mark(phase) after each phase and
+    end() before the clock tick; the tick's sleep is deliberately excluded.
+    """
+    __slots__ = ("name", "phases", "index_of", "size", "data", "totals", "head", "count",
+                 "visible", "_t", "_start", "_font", "_hud", "_hud_age")
+    def __init__(self, name, phases, size=600):
+        self.name = name
+        self.phases = tuple(phases)
+        self.index_of = {p: i for i, p in enumerate(self.phases)}
+        self.size = size
+        self.data = [array("d", bytes(8 * size)) for _ in self.phases]
+        self.totals = array("d", bytes(8 * size))
+        self.head = self.count = 0
+        self.visible = False
+        self._t = self._start = 0.0
+        self._font = None
+        self._hud = None
+        self._hud_age = 0
+    def begin(self):
+        self._t = self._start = time.perf_counter()
+        for col in self.data:
+            col[self.head] = 0.0
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.data[self.index_of[phase]][self.head] += now - self._t
+        self._t = now
+    def end(self):
+        self.totals[self.head] = time.perf_counter() - self._start
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+    def _frames(self):
+        # ring buffer indices, oldest first
+        start = (self.head - self.count) % self.size
+        return [(start + i) % self.size for i in range(self.count)]
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        ordered = sorted(self.totals[i] for i in self._frames())
+        return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+    def phase_means(self):
+        n = max(self.count, 1)
+        return [sum(col[i] for i in self._frames()) / n for col in self.data]
+    def toggle(self):
+        self.visible = not self.visible
+    def draw(self, screen, fps):
+        if not self.visible:
+            return
+        # re-render the text a few times a second rather than every frame
+        if self._hud is None or self._hud_age >= 15:
+            if self._font is None:
+                self._font = pygame.font.Font(None, 20)
+            means = self.phase_means()
+            lines = [f"{fps:5.1f} FPS  p50 {self.percentile(50)*1000:5.2f} ms"
+                     f"  p99 {self.percentile(99)*1000:5.2f} ms"]
+            lines += [f"{p:<10} {m*1000:5.2f} ms" for p, m in zip(self.phases, means)]
+            self._hud = ([self._font.render(l, True, PAL["white"]) for l in lines], means)
+            self._hud_age = 0
+        self._hud_age += 1
+        texts, means = self._hud
+        panel = pygame.Rect(8, 8, 270, 34 + 16 * len(texts))
+        screen.fill((0, 0, 0), panel)
+        for i, surf in enumerate(texts):
+            screen.blit(surf, (panel.x + 6, panel.y + 4 + 16 * i))
+        # stacked bar: one segment per phase, full width = one 60 FPS frame
+        x, y = panel.x + 6, panel.bottom - 14
+        scale = (panel.width - 12) * FPS
+        for i, m in enumerate(means):
+            w = int(m * scale)
+            screen.fill(PHASE_COLORS[i % len(PHASE_COLORS)], (x, y, w, 8))
+            x += w
+        screen.fill(PAL["white"], (panel.right - 7, y - 2, 1, 12))
+    def rows(self):
+        for i in self._frames():
+            yield [self.totals[i]] + [col[i] for col in self.data]
+    def export(self, path):
+        """Write the buffered frames to `path` as .json or .csv (seconds)."""
+        root, ext = os.path.splitext(path)
+        path = f"{root}-{self.name}{ext or '.csv'}"
+        header = ["frame"] + list(self.phases)
+        with open(path, "w") as f:
+            if ext == ".json":
+                json.dump({"scene": self.name, "phases": header,
+                           "p50": self.percentile(50), "p99": self.percentile(99),
+                           "frames": list(self.rows())}, f)
+            else:
+                f.write(",".join(header) + "\n")
+                for row in self.rows():
+                    f.write(",".join(f"{v:.6f}" for v in row) + "\n")
+        return path
+
+# --- Frame Capture ---
+CAPTURE_PATH = None  # set by --capture; .raw is written as RGB24 video, anything else is a PNG directory
+CAPTURE_POOL = 8
+_CAPTURE = []
+
+class FrameCapture:
+    """Copies frames into a fixed surface pool; a writer thread saves them.
+
+    capture() only blits into a free pool surface and queues its index, so
+    its cost is one screen-sized blit. When the writer falls behind and no
+    surface is free the frame is dropped instead of stalling the game.
+    A `read` callable (a GPU readback) is only run for frames that are
+    kept, and is counted in the main loop cost.
+    """
+    def __init__(self, path, size, pool=CAPTURE_POOL):
+        self.path = path
+        self.raw = path.endswith(".raw")
+        if self.raw:
+            self.file = open(path, "wb")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.file = None
+        self.size = size
+        self.pool = [pygame.Surface(size) for _ in range(pool)]
+        self.free = list(range(pool))  # list.pop/append are atomic under the GIL
+        self.ready = []
+        self.wake = threading.Condition()
+        self.frames = self.dropped = self.written = 0
+        self.spent = self.worst = 0.0
+        self.running = True
+        self.thread = threading.Thread(target=self._write, name="capture", daemon=True)
+        self.thread.start()
+
+    def capture(self, screen, read=None):
+        start = time.perf_counter()
+        n = self.frames
+        self.frames += 1
+        if not self.free or screen.get_size() != self.size:
+            self.dropped += 1
+        else:
+            i = self.free.pop()
+            self.pool[i].blit(read(screen) if read else screen, (0, 0))
+            with self.wake:
+                self.ready.append((i, n))
+                self.wake.notify()
+        took = time.perf_counter() - start
+        self.spent += took
+        self.worst = max(self.worst, took)
+
+    def _write(self):
+        while True:
+            with self.wake:
+                while not self.ready and self.running:
+                    self.wake.wait()
+                if not self.ready:
+                    return
+                i, n = self.ready.pop(0)
+            surf = self.pool[i]
+            if self.raw:
+                self.file.write(pygame.image.tobytes(surf, "RGB"))
+            else:
+                pygame.image.save(surf, os.path.join(self.path, f"frame_{n:06d}.png"))
+            self.written += 1
+            self.free.append(i)
+
+    def close(self):
+        """Flush queued frames, stop the writer and return a one-line summary."""
+        with self.wake:
+            self.running = False
+            self.wake.notify()
+        self.thread.join()
+        if self.file:
+            self.file.close()
+        mean = self.spent / max(self.frames, 1)
+        w, h = self.size
+        kind = f"raw rgb24 {w}x{h} @ {FPS} fps" if self.raw else "png"
+        return (f"capture: {self.written}/{self.frames} frames written ({kind}), "
+                f"{self.dropped} dropped, main loop cost {mean*1000:.3f} ms mean, "
+                f"{self.worst*1000:.3f} ms worst")
+
+def frame_capture(size=GAME_VIEW):
+    """The shared FrameCapture when --capture is on, else None."""
+    if CAPTURE_PATH and not _CAPTURE:
+        _CAPTURE.append(FrameCapture(CAPTURE_PATH, size))
+    return _CAPTURE[0] if _CAPTURE else None
+
+# --- Input ---
+IN_BACK, IN_DEBUG = 8, 16
+IN_REWIND, IN_SAVE, IN_LOAD = 32, 64, 128
+KEY_BINDINGS = {pygame.K_LEFT: IN_LEFT, pygame.K_RIGHT: IN_RIGHT, pygame.K_z: IN_JUMP,
+                pygame.K_ESCAPE: IN_BACK, pygame.K_F3: IN_DEBUG, pygame.K_BACKSPACE: IN_REWIND,
+                pygame.K_F5: IN_SAVE, pygame.K_F9: IN_LOAD}
+PAD_BUTTONS = {0: IN_JUMP, 1: IN_JUMP, 6: IN_BACK}
+PAD_DEADZONE = 0.5
+INPUT_NAMES = {"left": IN_LEFT, "right": IN_RIGHT, "jump": IN_JUMP, "back": IN_BACK,
+               "debug": IN_DEBUG, "rewind": IN_REWIND, "save": IN_SAVE, "load": IN_LOAD}
+RECORD_PATH = REPLAY_PATH = None  # set by --record / --replay: one input byte per game tick
+INPUT_STATS = False  # set by --input-stats
+
+class InputState:
+    """Folds each frame's events into IN_* bitfields: `held` and newly `pressed`.
+
+    Keyboard keys, gamepad buttons, hat and left stick all go through
+    rebindable tables. An injected source (a replay, AI policy or network
+    feed: any iterable of bitmasks) replaces the gameplay bits until it runs
+    out, while the other bits (back, debug, rewind, save, load) still come
+    from the devices. Calling
+    presented() after each flip records how long new device presses took
+    from the poll that saw them to the screen.
+    """
+    GAMEPLAY = IN_LEFT | IN_RIGHT | IN_JUMP
+
+    def __init__(self, keys=None, buttons=None, samples=600):
+        self.keys = dict(KEY_BINDINGS if keys is None else keys)
+        self.buttons = dict(PAD_BUTTONS if buttons is None else buttons)
+        self.joysticks = {}
+        self.events = []
+        self.held = self.pressed = 0
+        self.quit = False
+        self._keys = self._pad = self._hat = self._axis = self._device = 0
+        self.source = None
+        self.recording = None
+        self.latency = array("d", bytes(8 * samples))
+        self.lat_head = self.lat_count = 0
+        self._stamp = None
+
+    def rebind(self, bit, keys):
+        """Make `keys` (key codes) the only keys producing `bit`."""
+        self.keys = {k: b for k, b in self.keys.items() if b != bit}
+        self.keys.update(dict.fromkeys(keys, bit))
+
+    def load_keymap(self, path):
+        """Apply a JSON keymap like {"jump": ["z", "space"]}."""
+        with open(path) as f:
+            for name, keys in json.load(f).items():
+                self.rebind(INPUT_NAMES[name], [pygame.key.key_code(k) for k in keys])
+
+    def inject(self, source):
+        self.source = None if source is None else iter(source)
+
+    def poll(self):
+        now = time.perf_counter()
+        taps = 0
+        self.events = pygame.event.get()
+        for e in self.events:
+            t = e.type
+            if t == pygame.KEYDOWN:
+                bit = self.keys.get(e.key, 0)
+                self._keys |= bit
+                taps |= bit
+            elif t == pygame.KEYUP:
+                self._keys &= ~self.keys.get(e.key, 0)
+            elif t == pygame.JOYBUTTONDOWN:
+                bit = self.buttons.get(e.button, 0)
+                self._pad |= bit
+                taps |= bit
+            elif t == pygame.JOYBUTTONUP:
+                self._pad &= ~self.buttons.get(e.button, 0)
+            elif t == pygame.JOYHATMOTION:
+                x = e.value[0]
+                self._hat = IN_LEFT if x < 0 else IN_RIGHT if x > 0 else 0
+            elif t == pygame.JOYAXISMOTION and e.axis == 0:
+                v = e.value
+                self._axis = IN_LEFT if v < -PAD_DEADZONE else IN_RIGHT if v > PAD_DEADZONE else 0
+            elif t == pygame.JOYDEVICEADDED:
+                pad = pygame.joystick.Joystick(e.device_index)
+                self.joysticks[pad.get_instance_id()] = pad
+            elif t == pygame.JOYDEVICEREMOVED:
+                self.joysticks.pop(e.instance_id, None)
+                self._pad = self._hat = self._axis = 0
+            elif t == pygame.WINDOWFOCUSLOST:
+                self._keys = 0
+            elif t == pygame.QUIT:
+                self.quit = True
+        device = self._keys | self._pad | self._hat | self._axis
+        if (device | taps) & ~self._device and self._stamp is None:
+            self._stamp = now
+        self._device = device
+        # a key pressed and released within one frame still counts for that frame
+        held = device | taps
+        if self.source is not None:
+            bits = next(self.source, None)
+            if bits is None:
+                self.source = None
+            else:
+                held = (bits & self.GAMEPLAY) | (held & ~self.GAMEPLAY)
+        self.pressed = (held & ~self.held) | (taps & held)
+        self.held = held
+        if self.recording is not None:
+            self.recording.append(held & self.GAMEPLAY)
+        return held
+
+    def presented(self):
+        if self._stamp is not None:
+            self.latency[self.lat_head] = time.perf_counter() - self._stamp
+            self.lat_head = (self.lat_head + 1) % len(self.latency)
+            self.lat_count = min(self.lat_count + 1, len(self.latency))
+            self._stamp = None
+
+    def latency_report(self):
+        if not self.lat_count:
+            return "input latency: no presses"
+        vals = sorted(self.latency[:self.lat_count])
+        mean = sum(vals) / len(vals)
+        p95 = vals[min(len(vals) - 1, int(len(vals) * 0.95))]
+        return (f"input latency: {len(vals)} presses, {mean*1000:.2f} ms mean, "
+                f"{p95*1000:.2f} ms p95, {vals[-1]*1000:.2f} ms worst (poll to flip)")
+
+INPUT = InputState()
 
 # --- Menu Classes ---
 class Button:
+    __slots__ = ("rect", "text", "action", "hovered", "pressed", "original_y",
+                 "hover_offset", "last_hover_state")
     def __init__(self, x, y, width, height, text, action=None):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
@@ -232,11 +1443,7 @@ class Button:
         else:
             self.hover_offset = max(self.hover_offset - 0.5, 0)
         draw_y = self.original_y - self.hover_offset
-        shadow_rect = pygame.Rect(self.rect.x + 3, draw_y + 3, self.rect.width, self.rect.height)
-        pygame.draw.rect(screen, PAL["button_shadow"], shadow_rect, border_radius=10)
-        button_color = PAL["button_yellow"]
-        pygame.draw.rect(screen, button_color, (self.rect.x, draw_y, self.rect.width, self.rect.height), border_radius=10)
-        pygame.draw.rect(screen, PAL["text_brown"], (self.rect.x, draw_y, self.rect.width, self.rect.height), 3, border_radius=10)
+        screen.blit(ASSETS.get("button", self.rect.width, self.rect.height), (self.rect.x, draw_y))
         text_color = PAL["text_brown"]
         text_surf, text_rect = draw_text(self.text, 28, text_color, self.rect.centerx, draw_y + self.rect.height//2)
         screen.blit(text_surf, text_rect)
@@ -259,17 +1466,22 @@ class Button:
             self.pressed = False
         return None
 
+PARTICLE_COLORS = (
+    (255, 255, 255, 150),
+    (255, 215, 60, 150),
+    (164, 220, 255, 150)
+)
+
 class Particle:
+    __slots__ = ("x", "y", "size", "speed", "color", "alpha", "sway", "sway_offset")
     def __init__(self):
+        self.reset()
+    def reset(self):
         self.x = random.randint(0, WIDTH)
         self.y = random.randint(0, HEIGHT//2)
         self.size = random.randint(2, 5)
         self.speed = random.uniform(0.5, 2)
-        self.color = random.choice([
-            (255, 255, 255, 150),
-            (255, 215, 60, 150),
-            (164, 220, 255, 150)
-        ])
+        self.color = random.choice(PARTICLE_COLORS)
         self.alpha = random.randint(100, 200)
         self.sway = random.uniform(0.2, 0.8)
         self.sway_offset = random.uniform(0, 2 * math.pi)
@@ -278,22 +1490,19 @@ class Particle:
         self.x += math.sin(pygame.time.get_ticks() * 0.001 + self.sway_offset) * self.sway
         self.alpha -= 0.5
         if self.y > HEIGHT or self.alpha <= 0:
-            self.__init__()
+            self.reset()
     def draw(self, screen):
-        s = pygame.Surface((self.size*2, self.size*2), pygame.SRCALPHA)
-        pygame.draw.circle(s, (*self.color[:3], int(self.alpha)), (self.size, self.size), self.size)
-        screen.blit(s, (self.x, self.y))
+        dot = ASSETS.get("dot", self.color[:3], self.size)
+        dot.set_alpha(int(self.alpha))
+        screen.blit(dot, (self.x, self.y))
 
 class MainMenu:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        pygame.display.set_caption("NSMB2 Koopa Engine")
+    def __init__(self, display=None):
+        startup()
+        self.display = display or open_display()
+        self.screen = self.display.target((WIDTH, HEIGHT))
         self.clock = pygame.time.Clock()
-        self.running = True
-        self.showing_options = False
-        self.result = None
-        if OST_THEME and not pygame.mixer.get_busy():
-            OST_THEME.play(loops=-1)
+        self.profiler = FrameProfiler("menu", ("events", "update", "draw", "hud", "flip"))
         button_width, button_height = 220, 60
         start_x = WIDTH // 2 - button_width // 2
         start_y = HEIGHT // 2 + 30
@@ -305,17 +1514,31 @@ class MainMenu:
         self.options_buttons = [
             Button(start_x, start_y + 80, button_width, button_height, "BACK", self.action_back)
         ]
-        self.clouds = [(create_cloud(), random.randint(-50, WIDTH), random.randint(50, 200)) for _ in range(5)]
-        self.mountains = [(create_mountain(), random.randint(-100, WIDTH), HEIGHT - 150) for _ in range(3)]
-        self.ground_tiles = [pygame.Rect(x * 32, HEIGHT - 32, 32, 32) for x in range(WIDTH // 32 + 1)]
+        cloud, mountain = ASSETS.acquire("cloud"), ASSETS.acquire("mountain")
+        self.clouds = [(cloud, random.randint(-50, WIDTH), random.randint(50, 200)) for _ in range(5)]
+        self.mountains = [(mountain, random.randint(-100, WIDTH), HEIGHT - 150) for _ in range(3)]
+        self.ground = ASSETS.acquire("menu_ground")
         self.particles = [Particle() for _ in range(40)]
-        self.coin = create_coin()
-        self.mario = create_mario_icon()
-        self.title_y = -100
+        self.coin = ASSETS.acquire("coin")
+        self.mario = ASSETS.acquire("mario", None).get("idle", 1, 0)
         self.title_target_y = 100
-        self.mario_x = -100
         self.mario_target_x = WIDTH // 2
         self.coin_angle = 0
+        self.enter()
+    def enter(self):
+        """Reset per-visit state; art, particles and buttons are kept."""
+        self.display.set_caption("NSMB2 Koopa Engine")
+        self.running = True
+        self.showing_options = False
+        self.result = None
+        self.title_y = -100
+        self.mario_x = -100
+        if OST_THEME and not pygame.mixer.get_busy():
+            OST_THEME.play(loops=-1)
+        PRELOAD.request(WORLD_DATA[0][0], GAME_ASSETS)
+    def close(self):
+        for args in (("cloud",), ("mountain",), ("coin",), ("mario", None), ("menu_ground",)):
+            ASSETS.release(*args)
     def action_start(self):
         if SFX_COIN_SOUND: SFX_COIN_SOUND.play()
         self.result = "game"
@@ -328,14 +1551,21 @@ class MainMenu:
         pygame.quit()
         sys.exit()
     def run(self):
+        prof = self.profiler
         while self.running:
-            mouse_pos = pygame.mouse.get_pos()
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit(); sys.exit()
+            prof.begin()
+            self.screen = self.display.target((WIDTH, HEIGHT))
+            mouse_pos = self.display.to_buffer(pygame.mouse.get_pos(), (WIDTH, HEIGHT))
+            INPUT.poll()
+            if INPUT.quit:
+                pygame.quit(); sys.exit()
+            if INPUT.pressed & IN_DEBUG:
+                prof.toggle()
+            for event in INPUT.events:
                 btns = self.options_buttons if self.showing_options else self.buttons
                 for button in btns:
                     button.handle_event(event)
+            prof.mark("events")
             # Animations
             if self.title_y < self.title_target_y:
                 self.title_y += 3
@@ -350,9 +1580,20 @@ class MainMenu:
                 particle.update()
             for button in (self.options_buttons if self.showing_options else self.buttons):
                 button.check_hover(mouse_pos)
+            prof.mark("update")
             self.draw()
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            self.display.present(self.screen)
+            prof.mark("draw")
+            prof.draw(self.display.hud(), self.clock.get_fps())
+            prof.mark("hud")
+            self.display.flip()
+            INPUT.presented()
+            prof.mark("flip")
+            prof.end()
+            PRELOAD.idle(self.display)
+            wait_frame(self.clock)
+        if FRAME_STATS_PATH:
+            prof.export(FRAME_STATS_PATH)
         return self.result
     def draw(self):
         self.screen.fill(PAL["sky"])
@@ -372,12 +1613,7 @@ class MainMenu:
         coin_y = math.sin(self.coin_angle) * 10
         self.screen.blit(self.coin, (WIDTH//2 + 150, self.title_y + 30 + coin_y))
         self.screen.blit(self.mario, (self.mario_x - 20, self.title_y + 20))
-        for tile in self.ground_tiles:
-            pygame.draw.rect(self.screen, PAL["dirt_brown"], tile)
-            pygame.draw.line(self.screen, (120, 80, 50), (tile.left, tile.top), (tile.right, tile.top), 2)
-        for i in range(len(self.ground_tiles)):
-            if i % 2 == 0:
-                pygame.draw.line(self.screen, PAL["grass_green"], (i*32, HEIGHT-32), (i*32+32, HEIGHT-32), 3)
+        self.screen.blit(self.ground, (0, HEIGHT - 34))
         btns = self.options_buttons if self.showing_options else self.buttons
         for button in btns:
             button.draw(self.screen)
@@ -386,139 +1622,1411 @@ class MainMenu:
             self.screen.blit(s, r)
 
 # --- Game Classes ---
-class Player(pygame.sprite.Sprite):
+FIXED_POINT = False  # set by --fixed-point
+FIXED_UNIT = 100  # GRAVITY, JUMP_VEL and RUN_SPEED are exact in hundredths of a pixel
+_FLOAT_PHYSICS = (GRAVITY, RUN_SPEED, JUMP_VEL)
+_FIXED_PHYSICS = (round(GRAVITY * FIXED_UNIT), RUN_SPEED * FIXED_UNIT, JUMP_VEL * FIXED_UNIT)
+
+class Body:
+    """Sub-pixel physics state, kept apart from any render rect.
+
+    x, y, vx, vy are float pixels, or with fixed-point integers in
+    1/FIXED_UNIT px so trajectories are bit-identical on every machine.
+    w, h are whole pixels. `physics` is (gravity, run speed, jump velocity)
+    in the same units. Snapping to pixels happens in snap()/Camera.apply.
+    """
+    __slots__ = ("x", "y", "vx", "vy", "w", "h", "on_ground", "bumped", "unit", "physics")
+    def __init__(self, x, y, w, h, fixed=None):
+        fixed = FIXED_POINT if fixed is None else fixed
+        self.unit = FIXED_UNIT if fixed else 1
+        self.physics = _FIXED_PHYSICS if fixed else _FLOAT_PHYSICS
+        self.x, self.y = x * self.unit, y * self.unit
+        self.vx = self.vy = 0
+        self.w, self.h = w, h
+        self.on_ground = self.bumped = False
+    def move(self, cols):
+        u = self.unit
+        h = len(cols[0]) if cols else 0
+        w, bh, tile = self.w * u, self.h * u, TILE * u
+        self.x = sweep_x(cols, h, self.x, self.y, w, bh, self.vx, tile)[0]
+        self.y, hit = sweep_y(cols, h, self.x, self.y, w, bh, self.vy, tile)
+        self.on_ground = hit and self.vy > 0
+        self.bumped = hit and self.vy < 0
+        if hit:
+            self.vy = 0
+    def head_cells(self):
+        """(columns, row) of the tiles just above the body's top edge."""
+        tile = TILE * self.unit
+        return (range(int(self.x // tile), _ceil_div(self.x + self.w * self.unit, tile)),
+                int(self.y // tile) - 1)
+    def snap(self, rect):
+        u = self.unit
+        rect.x, rect.y = _round(self.x / u), _round(self.y / u)
+
+class Player:
+    __slots__ = ("image", "rect", "body", "frames", "facing", "anim", "anim_tick")
     def __init__(self, pos):
-        super().__init__()
-        self.image = solid(PAL["player"])
-        self.rect = self.image.get_rect(topleft=pos)
-        self.vel = pygame.Vector2(0,0)
-        self.on_ground = False
-    def update(self, tiles):
-        keys = pygame.key.get_pressed()
-        self.vel.x = (keys[pygame.K_RIGHT]-keys[pygame.K_LEFT])*4
-        if keys[pygame.K_z] and self.on_ground:
-            self.vel.y = -10
+        self.frames = mario_frames((VIEW_TILE, VIEW_TILE))
+        self.facing, self.anim, self.anim_tick = 1, "idle", 0
+        self.image = self.frames.get("idle", 1, 0)
+        self.rect = pygame.Rect(pos, (TILE, TILE))  # snapped copy for overlap tests
+        self.body = Body(pos[0], pos[1], self.rect.w, self.rect.h)
+    def animate(self):
+        body = self.body
+        anim = "jump" if not body.on_ground else "run" if body.vx else "idle"
+        if body.vx:
+            self.facing = 1 if body.vx > 0 else -1
+        if anim != self.anim:
+            self.anim, self.anim_tick = anim, 0
+        else:
+            self.anim_tick += 1
+        self.image = self.frames.get(anim, self.facing, self.anim_tick)
+    def update(self, cols, inputs=0):
+        body = self.body
+        gravity, run, jump = body.physics
+        body.vx = (bool(inputs & IN_RIGHT) - bool(inputs & IN_LEFT))*run
+        if inputs & IN_JUMP and body.on_ground:
+            body.vy = jump
             if SFX_JUMP_SOUND: SFX_JUMP_SOUND.play()
-        self.vel.y += GRAVITY
-        self.rect.x += self.vel.x
-        self.collide(tiles,'x')
-        self.rect.y += self.vel.y
-        self.on_ground=False
-        self.collide(tiles,'y')
-    def collide(self,tiles,dir):
-        for t in tiles:
-            if self.rect.colliderect(t):
-                if dir=='x':
-                    self.rect.x = t.right if self.vel.x<0 else t.left-self.rect.width
-                else:
-                    if self.vel.y>0:
-                        self.rect.bottom = t.top
-                        self.on_ground=True
-                    else:
-                        self.rect.top = t.bottom
-                    self.vel.y=0
+        body.vy += gravity
+        body.move(cols)
+        body.snap(self.rect)
+        self.animate()
+    def bounce(self):
+        self.body.vy = self.body.physics[2] // 2
+
+# --- Entities ---
+# char: (kind id, width, height, walk speed, colour)
+ENEMY_KINDS = {
+    "E": (1, 28, 28, 1.0, PAL["goomba"]),
+    "K": (2, 28, 32, 1.5, PAL["koopa"]),
+}
+ENEMY_ASSETS = {kind: ("solid", color, round(w * VIEW_SCALE), round(h * VIEW_SCALE))
+                for kind, w, h, _, color in ENEMY_KINDS.values()}  # ASSETS keys of ENEMY_SPRITES
+
+class Entities:
+    """Struct-of-arrays store for enemies.
+
+    Every field lives in its own contiguous numpy array and the systems
+    (gravity, walking, tile collision, stomping, culling) run over all live
+    entities at once, so the per-frame cost barely grows with the count.
+    Entities are at most one tile in each dimension. `solid` stops walking
+    and rising; `floor` (solid plus one-way platforms) stops falling.
+    """
+    ALIVE = 1
+    _FIELDS = ("x", "y", "vx", "vy", "w", "h", "kind", "flags")
+
+    def __init__(self, solid_grid, floor_grid=None, capacity=64):
+        self.solid = solid_grid
+        self.floor = solid_grid if floor_grid is None else floor_grid
+        self.n = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.w = np.zeros(capacity, np.int32)
+        self.h = np.zeros(capacity, np.int32)
+        self.kind = np.zeros(capacity, np.uint8)
+        self.flags = np.zeros(capacity, np.uint8)
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, n):
+        if n > len(self.x):
+            for name in self._FIELDS:
+                old = getattr(self, name)
+                new = np.zeros(max(n, len(old) * 2), old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+
+    def spawn(self, ch, x, y):
+        kind, w, h, speed, _ = ENEMY_KINDS[ch]
+        self._reserve(self.n + 1)
+        i = self.n
+        self.x[i], self.y[i] = x + (TILE - w) // 2, y + TILE - h
+        self.vx[i], self.vy[i] = -speed, 0
+        self.w[i], self.h[i], self.kind[i] = w, h, kind
+        self.flags[i] = self.ALIVE
+        self.n += 1
+        return i
+
+    def _solid_at(self, cols, rows, grid=None):
+        grid = self.solid if grid is None else grid
+        gh, gw = grid.shape
+        inside = (cols >= 0) & (cols < gw) & (rows >= 0) & (rows < gh)
+        hit = np.zeros(cols.shape, bool)
+        hit[inside] = grid[rows[inside], cols[inside]]
+        return hit
+
+    def update(self):
+        n = self.n
+        if not n:
+            return
+        x, y, vx, vy = self.x[:n], self.y[:n], self.vx[:n], self.vy[:n]
+        w, h, flags = self.w[:n], self.h[:n], self.flags[:n]
+        vy += GRAVITY
+        # walk, turning around at walls
+        x += vx
+        forward = vx > 0
+        col = (np.where(forward, np.ceil(x + w) - 1, x) // TILE).astype(np.intp)
+        top, bottom = (y // TILE).astype(np.intp), ((np.ceil(y + h) - 1) // TILE).astype(np.intp)
+        hit = self._solid_at(col, top) | self._solid_at(col, bottom)
+        x[hit] = np.where(forward, col * TILE - w, (col + 1) * TILE)[hit]
+        vx[hit] *= -1
+        # fall, landing on or bumping into tiles; one-way platforms only
+        # stop a fall whose bottom edge enters their row from above
+        y += vy
+        down = vy > 0
+        row = (np.where(down, np.ceil(y + h) - 1, y) // TILE).astype(np.intp)
+        left, right = (x // TILE).astype(np.intp), ((np.ceil(x + w) - 1) // TILE).astype(np.intp)
+        hit = self._solid_at(left, row) | self._solid_at(right, row)
+        lands = down & (row > bottom) & (self._solid_at(left, row, self.floor)
+                                         | self._solid_at(right, row, self.floor))
+        hit |= lands
+        y[hit] = np.where(down, row * TILE - h, (row + 1) * TILE)[hit]
+        vy[hit] = 0
+        flags[y > self.solid.shape[0] * TILE] &= ~np.uint8(self.ALIVE)
+        self._compact()
+
+    def stomp(self, rect):
+        """Kill every enemy the falling player lands on; returns the count."""
+        n = self.n
+        x, y, w, h = self.x[:n], self.y[:n], self.w[:n], self.h[:n]
+        hit = ((x < rect.right) & (x + w > rect.left) & (y < rect.bottom)
+               & (y + h > rect.top) & (rect.bottom < y + h / 2))
+        count = int(hit.sum())
+        if count:
+            self.flags[:n][hit] &= ~np.uint8(self.ALIVE)
+            self._compact()
+        return count
+
+    def state(self):
+        """The live entities as bytes: a u16 count, then each field's array."""
+        n = self.n
+        return struct.pack("<H", n) + b"".join(getattr(self, f)[:n].tobytes() for f in self._FIELDS)
+
+    def load_state(self, data, offset=0):
+        """Inverse of state(); returns the offset just past it."""
+        n, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        self._reserve(n)
+        for name in self._FIELDS:
+            arr = getattr(self, name)
+            arr[:n] = np.frombuffer(data, arr.dtype, n, offset)
+            offset += n * arr.itemsize
+        self.n = n
+        return offset
+
+    def _compact(self):
+        n = self.n
+        keep = (self.flags[:n] & self.ALIVE) != 0
+        m = int(keep.sum())
+        if m != n:
+            for name in self._FIELDS:
+                arr = getattr(self, name)
+                arr[:m] = arr[:n][keep]
+            self.n = m
+
+    def draw(self, screen, camera):
+        n = self.n
+        x = self.x[:n]
+        idx = np.flatnonzero((x + self.w[:n] > camera.ox) & (x < camera.visible.right))
+        if not len(idx):
+            return
+        sprites = ENEMY_SPRITES
+        xs = ((x[idx] * VIEW_SCALE).astype(int) - camera.sx).tolist()
+        ys = ((self.y[idx] * VIEW_SCALE).astype(int) - camera.sy).tolist()
+        screen.blits([(sprites[k], (sx, sy)) for k, sx, sy in zip(self.kind[idx].tolist(), xs, ys)],
+                     doreturn=False)
+
+def _find_all(row, ch):
+    x = row.find(ch)
+    while x >= 0:
+        yield x
+        x = row.find(ch, x + 1)
+
+_DRAWN_TILES = [i for i, drawn in enumerate(IS_DRAWN) if drawn]
+_MUTABLE_TILES = tiles_with(T_COLLECT | T_BREAK | T_BONUS)
 
 class Level:
+    """A level's live tile state.
+
+    Edits go through set_tile (or collect/bump), which update only what the
+    one cell affects: its collision byte, its column's draw list, the coin
+    index and the enemies' solid and floor grids. Each edit is appended to
+    `changes` as (kind, col, row, old id, new id) for sounds, effects and observers;
+    the engine clears it at the start of every tick. `dynamic` lists the
+    only cells play can change, so cell_state() captures the level's
+    progress in one byte per cell.
+    """
+    __slots__ = ("grid", "w", "h", "cols", "tile_cols", "coins", "coin_cols", "flag", "hazards",
+                 "enemies", "solid", "floor", "changes", "dynamic", "spawn")
     def __init__(self, grid):
         self.grid = grid
-        self.w = len(grid[0])
         self.h = len(grid)
-        self.tiles=[]
-        self.coins=[]
+        cols = level_columns(grid)
+        self.w = len(cols)
+        self.cols = list(map(bytearray, cols))  # tile ids, cols[c][r]
+        self.hazards = any(t in col for t in _HAZARD_IDS for col in cols)
+        self.spawn = find_spawn(grid, cols)  # player start, px
+        # (tile id, backbuffer y) of drawn tiles per column, so drawing only visits visible columns
+        self.tile_cols = [[] for _ in cols]
+        self.coins = {}  # (col, row) -> pickup rect
+        self.coin_cols = [[] for _ in cols]  # the same rects per column, for drawing
         self.flag=None
-        for y,row in enumerate(grid):
-            for x,ch in enumerate(row):
-                if ch=="#":
-                    self.tiles.append(pygame.Rect(x*TILE,y*TILE,TILE,TILE))
-                elif ch=="C":
-                    self.coins.append(pygame.Rect(x*TILE+8,y*TILE+8,16,16))
-                elif ch=="F":
-                    self.flag = pygame.Rect(x*TILE,y*TILE,32,64)
+        self.changes = []
+        spawns = []
+        dynamic = {}
+        for y,row in enumerate(map(tile_row, grid)):
+            for t in _MUTABLE_TILES:
+                for x in _find_all(row, t):
+                    dynamic[x, y] = None
+                    if y and TILE_FLAGS[t] & T_BONUS:
+                        dynamic[x, y - 1] = None  # where its coin pops out
+            for t in _DRAWN_TILES:
+                entry = (t, y*VIEW_TILE)
+                for x in _find_all(row, t):
+                    self.tile_cols[x].append(entry)
+            for x in _find_all(row, COIN_TILE):
+                rect = self.coins[x, y] = pygame.Rect(x*TILE+8,y*TILE+8,16,16)
+                self.coin_cols[x].append(rect)
+            for x in _find_all(row, FLAG_TILE):
+                self.flag = pygame.Rect(x*TILE,y*TILE,32,64)
+            for ch in ENEMY_KINDS:
+                for x in _find_all(row, TILE_IDS[ch]):
+                    spawns.append((ch, x*TILE, y*TILE))
+        self.dynamic = list(dynamic)
+        # enemies need numpy; without it levels simply have none
+        self.enemies = self.solid = self.floor = None
+        if np is not None:
+            ids = np.frombuffer(b"".join(cols), np.uint8).reshape(self.w, self.h).T
+            self.solid = np.frombuffer(BLOCKS_SIDE, np.uint8).astype(bool)[ids]
+            self.floor = np.frombuffer(BLOCKS_DOWN, np.uint8).astype(bool)[ids]
+            self.enemies = Entities(self.solid, self.floor)
+            for ch, x, y in spawns:
+                self.enemies.spawn(ch, x, y)
+    def set_tile(self, c, r, t, kind="set"):
+        col = self.cols[c]
+        old = col[r]
+        if old == t:
+            return
+        col[r] = t
+        if old == COIN_TILE:
+            del self.coins[c, r]
+        if t == COIN_TILE:
+            self.coins[c, r] = pygame.Rect(c*TILE+8, r*TILE+8, 16, 16)
+        if old == COIN_TILE or t == COIN_TILE:
+            self.coin_cols[c] = [self.coins[c, y] for y, t in enumerate(col) if t == COIN_TILE]
+        if TILE_FLAGS[t] & T_HAZARD:
+            self.hazards = True
+        if IS_DRAWN[old] or IS_DRAWN[t]:
+            self.tile_cols[c] = [(t, y*VIEW_TILE) for y, t in enumerate(col) if IS_DRAWN[t]]
+        if self.solid is not None:
+            self.solid[r, c] = BLOCKS_SIDE[t]
+            self.floor[r, c] = BLOCKS_DOWN[t]
+        self.changes.append((kind, c, r, old, t))
+    def cell_state(self):
+        cols = self.cols
+        return bytes([cols[c][r] for c, r in self.dynamic])
+    def load_cell_state(self, data):
+        """Put every dynamic cell back to the ids in `data` (from cell_state)."""
+        if len(data) != len(self.dynamic):
+            raise ValueError("cell state does not match this level")
+        cols = self.cols
+        for (c, r), t in zip(self.dynamic, data):
+            if cols[c][r] != t:
+                self.set_tile(c, r, t, "restore")
+    def collect_touching(self, rect):
+        """Collect every coin `rect` overlaps; returns how many."""
+        n = 0
+        for c in range(max(rect.left // TILE, 0), min((rect.right - 1) // TILE + 1, self.w)):
+            for r in range(max(rect.top // TILE, 0), min((rect.bottom - 1) // TILE + 1, self.h)):
+                coin = self.coins.get((c, r))
+                if coin and rect.colliderect(coin):
+                    self.set_tile(c, r, AIR, "collect")
+                    n += 1
+        return n
+    def bump(self, c, r):
+        """Hit (c, r) from below: bricks break, ? blocks pop a coin on top."""
+        if not (0 <= c < self.w and 0 <= r < self.h):
+            return
+        flags = TILE_FLAGS[self.cols[c][r]]
+        if flags & T_BREAK:
+            self.set_tile(c, r, AIR, "break")
+        elif flags & T_BONUS:
+            self.set_tile(c, r, USED_TILE, "bump")
+            if r and self.cols[c][r - 1] == AIR:
+                self.set_tile(c, r - 1, COIN_TILE, "spawn")
     def draw(self,screen,camera):
-        for rect in self.tiles:
-            screen.blit(IMG["#"],camera.apply(rect))
-        for rect in self.coins:
-            screen.blit(IMG["C"],camera.apply(rect))
-        if self.flag:
-            screen.blit(IMG["F"],camera.apply(self.flag))
+        sx, sy, visible = camera.sx, camera.sy, camera.visible
+        images, ts = IMG, VIEW_TILE
+        shown = range(max(visible.x // TILE, 0), min(visible.right // TILE + 1, self.w))
+        screen.blits([(images[t], (c*ts - sx, y - sy))
+                      for c in shown for t, y in self.tile_cols[c]], doreturn=False)
+        coin, apply = IMG[COIN_TILE], camera.apply
+        screen.blits([(coin, apply(rect)) for c in shown for rect in self.coin_cols[c]],
+                     doreturn=False)
+        if self.flag and visible.colliderect(self.flag):
+            screen.blit(IMG[FLAG_TILE], camera.apply(self.flag))
+        if self.enemies is not None:
+            self.enemies.draw(screen, camera)
 
 class Camera:
-    def __init__(self):
-        self.offset = pygame.Vector2(0,0)
-    def follow(self, player):
-        target_x = player.rect.centerx - SCROLL_EDGE
-        if target_x>self.offset.x:
-            self.offset.x = target_x
-    def apply(self, rect):
-        return rect.move(-int(self.offset.x), -int(self.offset.y))
+    """Follows a target through a screen-space deadzone with smoothing.
+
+    x, y is the smoothed float position, clamped to `bounds` (the level size
+    in px) when given; `size` is the world area in view. Every move
+    precomputes the integer world offset ox, oy, the `visible` world rect
+    used for culling, and the backbuffer offset sx, sy (at VIEW_SCALE)
+    used for drawing, so per-frame camera work is O(1) and allocation-free.
+    """
+    __slots__ = ("x", "y", "ox", "oy", "sx", "sy", "visible", "bounds", "deadzone", "smoothing")
+    def __init__(self, bounds=None, size=(WIDTH, HEIGHT), deadzone=CAMERA_DEADZONE,
+                 smoothing=CAMERA_SMOOTHING):
+        self.x = self.y = 0.0
+        self.ox = self.oy = self.sx = self.sy = 0
+        self.visible = pygame.Rect(0, 0, *size)
+        self.bounds = bounds
+        w, h = size
+        left, top, right, bottom = deadzone
+        self.deadzone = (left * w, top * h, right * w, bottom * h)
+        self.smoothing = smoothing
+    def move_to(self, x, y):
+        if self.bounds:
+            bw, bh = self.bounds
+            x = min(max(x, 0), max(bw - self.visible.w, 0))
+            y = min(max(y, 0), max(bh - self.visible.h, 0))
+        self.x, self.y = x, y
+        self.ox = self.visible.x = _round(x)
+        self.oy = self.visible.y = _round(y)
+        self.sx, self.sy = _round(x * VIEW_SCALE), _round(y * VIEW_SCALE)
+    def follow(self, rect, smoothing=None):
+        """Ease towards keeping `rect` inside the deadzone; smoothing=1 snaps."""
+        left, top, right, bottom = self.deadzone
+        x, y = self.x, self.y
+        sx, sy = rect.centerx - x, rect.centery - y
+        gx = x + (sx - right if sx > right else sx - left if sx < left else 0)
+        gy = y + (sy - bottom if sy > bottom else sy - top if sy < top else 0)
+        s = self.smoothing if smoothing is None else smoothing
+        self.move_to(x + (gx - x) * s, y + (gy - y) * s)
+    def apply(self, obj):
+        """Backbuffer position of a Rect or Body's top-left, snapped to whole pixels."""
+        s = VIEW_SCALE
+        if type(obj) is Body:
+            s /= obj.unit
+        return _round(obj.x * s) - self.sx, _round(obj.y * s) - self.sy
 
 class GameEngine:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WIDTH,HEIGHT))
-        pygame.display.set_caption("Python Mario Vibes")
+    def __init__(self, headless=False, display=None):
+        startup()
+        self.display = None
+        if not headless:
+            self.display = display or open_display()
         self.clock = pygame.time.Clock()
+        self.profiler = FrameProfiler("game", ("events", "player", "enemies", "pickups",
+                                               "background", "level", "blit", "capture",
+                                               "present", "hud", "flip"))
+        self.frames = ASSETS.acquire("mario", (VIEW_TILE, VIEW_TILE))
+        self.parallax = None  # acquired on first draw; headless runs may never draw
+        # rewind ring; headless runs (farm, env) restart from self.start only
+        self.snapshot_every = 0 if headless else SNAPSHOT_EVERY
+        self.snapshots = collections.deque(maxlen=SNAPSHOT_RING)
+        self.saved = None
+        self.enter()
+    def enter(self):
+        """Start a fresh run from W1-1."""
+        if self.display:
+            self.display.set_caption("Python Mario Vibes")
+        if OST_THEME:
+            OST_THEME.stop()
         self.world = 0
         self.level = 0
+        self.deaths = 0
         self.load_level()
-    def load_level(self):
-        grid = WORLD_DATA[self.world][self.level]
-        self.level_obj = Level(grid)
-        spawn_x, spawn_y = TILE*2, HEIGHT-3*TILE
-        for y, row in enumerate(grid):
-            for x, ch in enumerate(row):
-                if ch in "#G":
-                    spawn_x, spawn_y = x*TILE, (y-1)*TILE
-                    break
-            if spawn_x != TILE*2 or spawn_y != HEIGHT-3*TILE:
-                break
-        self.player = Player((spawn_x, spawn_y))
-        self.camera = Camera()
+    def load_level(self, grid=None):
+        grid = grid or WORLD_DATA[self.world][self.level]
+        self.level_obj = PRELOAD.take(grid) or Level(grid)
+        self.player = Player(self.level_obj.spawn)
+        self.camera = Camera((len(self.level_obj.cols) * TILE, self.level_obj.h * TILE))
+        self.camera.follow(self.player.rect, 1)
         self.coins = 0
+        self.tick = 0
+        self.snapshots.clear()
+        self.start = self.snapshot()
+    def snapshot(self):
+        return take_snapshot(self)
+    def restore(self, blob):
+        restore_snapshot(self, blob)
+        ring = self.snapshots
+        while ring and snapshot_tick(ring[-1]) >= self.tick:
+            ring.pop()  # that future no longer happens
+    def restart(self):
+        """Back to the state the level was loaded in, without rebuilding it."""
+        self.restore(self.start)
+        self.snapshots.clear()
+    def rewind(self):
+        """Restore the newest ring snapshot at least half a period old."""
+        while self.snapshots:
+            blob = self.snapshots.pop()
+            if not self.snapshots or self.tick - snapshot_tick(blob) >= self.snapshot_every // 2:
+                self.restore(blob)
+                return True
+        return False
     def advance(self):
         self.level += 1
         if self.level >= len(WORLD_DATA[self.world]):
             self.level = 0
             self.world = (self.world + 1) % len(WORLD_DATA)
         self.load_level()
+    def step(self, inputs=0):
+        """Advance the game one tick; returns "flag", "death" or None."""
+        prof = self.profiler
+        if self.snapshot_every and self.tick and not self.tick % self.snapshot_every:
+            self.snapshots.append(self.snapshot())
+        self.tick += 1
+        level = self.level_obj
+        level.changes.clear()
+        self.player.update(level.cols, inputs)
+        body = self.player.body
+        if body.bumped:
+            cols, r = body.head_cells()
+            for c in cols:
+                level.bump(c, r)
+        prof.mark("player")
+        enemies = self.level_obj.enemies
+        if enemies is not None:
+            enemies.update()
+            if self.player.body.vy > 0 and enemies.stomp(self.player.rect):
+                self.player.bounce()
+        prof.mark("enemies")
+        self.camera.follow(self.player.rect)
+        self.coins += level.collect_touching(self.player.rect)
+        for kind, *_ in level.changes:
+            sound = {"collect": SFX_COIN_SOUND, "break": SFX_CLICK, "bump": SFX_CLICK}.get(kind)
+            if sound: sound.play()
+        if self.level_obj.flag and self.player.rect.colliderect(self.level_obj.flag):
+            return "flag"
+        rect = self.player.rect
+        if rect.top > level.h * TILE or (level.hazards and tile_flags_under(
+                level.cols, level.h, rect.x, rect.y, rect.w, rect.h) & T_HAZARD):
+            self.deaths += 1
+            return "death"
+        return None
+    def draw_scene(self, screen):
+        prof = self.profiler
+        screen.fill(PAL["sky"])
+        if self.parallax is None:
+            self.parallax = ASSETS.acquire("parallax", VIEW_SCALE)
+        for layer in self.parallax:
+            layer.draw(screen, self.camera, self.level_obj.h * TILE)
+        prof.mark("background")
+        self.level_obj.draw(screen,self.camera)
+        prof.mark("level")
+        screen.blit(self.player.image,self.camera.apply(self.player.body))
+        prof.mark("blit")
     def run(self):
         running = True
+        prof = self.profiler
+        if RECORD_PATH:
+            INPUT.recording = array("B")
+        if REPLAY_PATH:
+            with open(REPLAY_PATH, "rb") as f:
+                INPUT.inject(f.read())
         while running:
-            for e in pygame.event.get():
-                if e.type==pygame.QUIT:
-                    pygame.quit(); sys.exit()
-                if e.type==pygame.KEYDOWN and e.key==pygame.K_ESCAPE:
-                    running = False
-            self.player.update(self.level_obj.tiles)
-            self.camera.follow(self.player)
-            for c in self.level_obj.coins[:]:
-                if self.player.rect.colliderect(c):
-                    self.level_obj.coins.remove(c)
-                    self.coins+=1
-                    if SFX_COIN_SOUND: SFX_COIN_SOUND.play()
-            if self.level_obj.flag and self.player.rect.colliderect(self.level_obj.flag):
+            prof.begin()
+            INPUT.poll()
+            if INPUT.quit:
+                self.finish()
+                pygame.quit(); sys.exit()
+            if INPUT.pressed & IN_BACK:
+                running = False
+            if INPUT.pressed & IN_DEBUG:
+                prof.toggle()
+            if INPUT.pressed & IN_SAVE:
+                self.saved = self.snapshot()
+            # jumping in time would desync a recording or replay from its inputs
+            if INPUT.recording is None and INPUT.source is None:
+                if INPUT.pressed & IN_REWIND:
+                    self.rewind()
+                if INPUT.pressed & IN_LOAD and self.saved:
+                    self.restore(self.saved)
+            prof.mark("events")
+            result = self.step(INPUT.held)
+            if result == "flag":
                 self.advance()
-            self.screen.fill(PAL["sky"])
-            self.level_obj.draw(self.screen,self.camera)
-            self.screen.blit(self.player.image,self.camera.apply(self.player.rect))
-            pygame.display.set_caption(f"W{self.world+1}-{self.level+1}  Coins:{self.coins}")
-            pygame.display.flip()
-            self.clock.tick(FPS)
+            elif result == "death":
+                self.restart()
+            prof.mark("pickups")
+            screen = self.display.target(GAME_VIEW)
+            self.draw_scene(screen)
+            capture = frame_capture()
+            if capture:
+                capture.capture(screen, self.display.read)
+            prof.mark("capture")
+            self.display.present(screen)
+            prof.mark("present")
+            prof.draw(self.display.hud(), self.clock.get_fps())
+            prof.mark("hud")
+            self.display.set_caption(f"W{self.world+1}-{self.level+1}  Coins:{self.coins}")
+            self.display.flip()
+            INPUT.presented()
+            prof.mark("flip")
+            prof.end()
+            wait_frame(self.clock)
+        self.finish()
         return "menu"
+    def close(self):
+        ASSETS.release("mario", (VIEW_TILE, VIEW_TILE))
+        if self.parallax is not None:
+            ASSETS.release("parallax", VIEW_SCALE)
+            self.parallax = None
+    def finish(self):
+        if FRAME_STATS_PATH:
+            self.profiler.export(FRAME_STATS_PATH)
+        if INPUT.recording is not None:
+            with open(RECORD_PATH, "wb") as f:
+                f.write(INPUT.recording)
+            INPUT.recording = None
+        INPUT.inject(None)
+        if INPUT_STATS:
+            print(INPUT.latency_report())
+
+# --- Snapshots ---
+# A snapshot is the whole mutable state of a GameEngine as one bytes blob:
+# header, player body and animation, camera, dynamic level cells, enemies
+# and the RNG. Taking or restoring one costs O(state), not O(level), so
+# restarts, rewinds and save slots never rebuild the Level.
+SNAPSHOT_EVERY = 30  # ticks between rewind snapshots
+SNAPSHOT_RING = 120  # kept snapshots: a minute of rewind at 60 fps
+_SNAP_MAGIC, _SNAP_VERSION = b"KSNP", 1
+_SNAP_HEAD = struct.Struct("<4sBHHII")  # magic, version, world, level, tick, coins
+_SNAP_PLAYER = struct.Struct("<4d??bBI")  # x, y, vx, vy, on ground, bumped, facing, anim, tick
+_SNAP_CAMERA = struct.Struct("<2d")
+_SNAP_RNG = struct.Struct("<625I?d")  # Mersenne Twister words + cached gauss
+_ANIMS = ("idle", "run", "jump")
+
+def snapshot_tick(blob):
+    return _SNAP_HEAD.unpack_from(blob)[4]
+
+def take_snapshot(game):
+    player, level = game.player, game.level_obj
+    body = player.body
+    cells = level.cell_state()
+    _, words, gauss = random.getstate()
+    return b"".join((
+        _SNAP_HEAD.pack(_SNAP_MAGIC, _SNAP_VERSION, game.world, game.level, game.tick, game.coins),
+        _SNAP_PLAYER.pack(body.x, body.y, body.vx, body.vy, body.on_ground, body.bumped,
+                          player.facing, _ANIMS.index(player.anim), player.anim_tick),
+        _SNAP_CAMERA.pack(game.camera.x, game.camera.y),
+        struct.pack("<I", len(cells)), cells,
+        level.enemies.state() if level.enemies is not None else bytes(2),
+        _SNAP_RNG.pack(*words, gauss is not None, gauss or 0.0),
+    ))
+
+def restore_snapshot(game, blob):
+    """Put `game` back into the state take_snapshot(game) recorded.
+
+    A snapshot from another world/level first loads that level; one taken on
+    a custom grid must be restored while that grid is loaded.
+    """
+    magic, version, world, level, tick, coins = _SNAP_HEAD.unpack_from(blob)
+    if magic != _SNAP_MAGIC or version != _SNAP_VERSION:
+        raise ValueError("not a snapshot, or from another version")
+    if (world, level) != (game.world, game.level):
+        game.world, game.level = world, level
+        game.load_level()
+    offset = _SNAP_HEAD.size
+    x, y, vx, vy, on_ground, bumped, facing, anim, anim_tick = _SNAP_PLAYER.unpack_from(blob, offset)
+    offset += _SNAP_PLAYER.size
+    player = game.player
+    body = player.body
+    if body.unit != 1:  # fixed-point state is integers, exact in a double
+        x, y, vx, vy = int(x), int(y), int(vx), int(vy)
+    body.x, body.y, body.vx, body.vy = x, y, vx, vy
+    body.on_ground, body.bumped = on_ground, bumped
+    body.snap(player.rect)
+    player.facing, player.anim, player.anim_tick = facing, _ANIMS[anim], anim_tick
+    player.image = player.frames.get(player.anim, facing, anim_tick)
+    game.camera.move_to(*_SNAP_CAMERA.unpack_from(blob, offset))
+    offset += _SNAP_CAMERA.size
+    n, = struct.unpack_from("<I", blob, offset)
+    offset += 4
+    lvl = game.level_obj
+    lvl.load_cell_state(blob[offset:offset + n])
+    offset += n
+    if lvl.enemies is not None:
+        offset = lvl.enemies.load_state(blob, offset)
+    else:
+        offset += 2
+    *words, has_gauss, gauss = _SNAP_RNG.unpack_from(blob, offset)
+    random.setstate((3, tuple(words), gauss if has_gauss else None))
+    game.tick, game.coins = tick, coins
+
+# --- Preloading ---
+# What START needs is prepared while the menu idles: the first level is
+# compiled on a thread (Level is bytes, Rects and numpy arrays, safe off the
+# main thread) and the game's surfaces are built, and uploaded as textures
+# on the sdl2 backend, one per menu frame on the main thread.
+GAME_ASSETS = (("mario", (VIEW_TILE, VIEW_TILE)), ("parallax", VIEW_SCALE)) + tuple(
+    ("solid", PAL[color], VIEW_TILE, VIEW_TILE) for color in TILE_SPRITES if color
+) + tuple(ENEMY_ASSETS.values())  # the IMG tiles and ENEMY_SPRITES
+
+class Preloader:
+    """One level compiled ahead of time, plus assets to warm.
+
+    take(grid) hands over the Level built for that very grid object,
+    waiting for the thread if it is still running, or returns None so the
+    caller builds it itself; a Level is only ever handed out once.
+    """
+    __slots__ = ("grid", "level", "thread", "assets")
+    def __init__(self):
+        self.grid = self.level = self.thread = None
+        self.assets = []
+    def request(self, grid, assets=()):
+        self.assets = list(assets)
+        if grid is self.grid:
+            return
+        self.grid, self.level = grid, None
+        self.thread = threading.Thread(target=self._compile, args=(grid,), name="preload", daemon=True)
+        self.thread.start()
+    def _compile(self, grid):
+        level = Level(grid)
+        if grid is self.grid:  # a newer request replaces this one
+            self.level = level
+    def idle(self, display):
+        """Build one pending asset; call once per otherwise idle frame."""
+        if self.assets:
+            display.warm(ASSETS.get(*self.assets.pop()))
+    def take(self, grid):
+        if grid is None or grid is not self.grid:
+            return None
+        self.thread.join()
+        level = self.level
+        self.grid = self.level = self.thread = None
+        return level
+
+PRELOAD = Preloader()
+
+# --- Scenes ---
+class SceneManager:
+    """Owns the window and keeps each scene alive across switches.
+
+    Scenes are built on first use with the shared Display, then re-entered
+    with enter(); run() returns the name of the next scene or None to stop.
+    """
+    factories = {"menu": MainMenu, "game": GameEngine}
+
+    def __init__(self, display=None):
+        self.display = display or open_display()
+        self.scenes = {}
+
+    def add(self, name, scene):
+        self.scenes[name] = scene
+        return scene
+
+    def get(self, name):
+        scene = self.scenes.get(name)
+        if scene is None:
+            scene = self.add(name, self.factories[name](display=self.display))
+        return scene
+
+    def switch(self, name):
+        if name not in self.scenes:
+            return self.get(name)  # scenes enter() when built
+        scene = self.scenes[name]
+        scene.enter()
+        return scene
+
+    def run(self, name="menu"):
+        while name in self.factories:
+            name = self.switch(name).run()
+
+    def close(self):
+        """Drop every scene and the assets it holds."""
+        for scene in self.scenes.values():
+            scene.close()
+        self.scenes.clear()
+
+# --- Diagnostics ---
+def _unslotted(cls):
+    # the same class rebuilt without __slots__, i.e. the old __dict__ layout
+    ns = {k: v for k, v in vars(cls).items() if k != "__slots__" and k not in cls.__slots__}
+    return type(cls.__name__, cls.__bases__, ns)
+
+def _footprint(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+def memory_report(reads=200000):
+    """Per-object size and attribute read/write speed, __dict__ vs __slots__."""
+    import timeit
+    cases = [
+        (Player, ((0, 0),), "body"),
+        (Body, (0, 0, TILE, TILE), "x"),
+        (Particle, (), "y"),
+        (Button, (0, 0, 220, 60, "START GAME"), "hovered"),
+        (Camera, (), "x"),
+        (Level, (WORLD_DATA[0][0],), "cols"),
+    ]
+    print(f"{'class':<10}{'dict B':>8}{'slots B':>9}{'dict get':>10}{'slots get':>11}"
+          f"{'dict set':>10}{'slots set':>11}   (ns per access)")
+    for cls, args, attr in cases:
+        row = [cls.__name__]
+        objs = [_unslotted(cls)(*args), cls(*args)]
+        row += [_footprint(o) for o in objs]
+        for stmt in ("o.{0}", "o.{0} = v"):
+            for o in objs:
+                env = {"o": o, "v": getattr(o, attr)}
+                row.append(timeit.timeit(stmt.format(attr), globals=env, number=reads) / reads * 1e9)
+        print(f"{row[0]:<10}{row[1]:>8}{row[2]:>9}{row[3]:>10.1f}{row[4]:>11.1f}"
+              f"{row[5]:>10.1f}{row[6]:>11.1f}")
+    pool = [Particle() for _ in range(10000)]
+    old_pool = [_unslotted(Particle)() for _ in range(10000)]
+    print(f"10k particle pool: {sum(map(_footprint, old_pool)) // 1024} KiB with __dict__, "
+          f"{sum(map(_footprint, pool)) // 1024} KiB with __slots__")
+    print(ASSETS.report())
+
+# qualname or class name -> subsystem; exact qualnames win over class names
+SUBSYSTEMS = {
+    "idle": ("wait_frame",),
+    "audio": ("generate_tone", "create_simple_ost", "load_sounds"),
+    "menu": ("MainMenu", "Button", "Particle"),
+    "level": ("Level", "auto_worlds", "_random_level", "analyze_level", "find_spawn",
+              "GameEngine.load_level", "GameEngine.advance"),
+    "physics": ("Player", "Body", "Entities", "Camera", "sweep_x", "sweep_y"),
+    "assets": ("AssetManager", "load_tiles", "_build_mario_frames", "_build_parallax",
+               "_tiled_strip", "solid", "create_cloud", "create_mountain", "create_coin"),
+    "render": ("Level.draw", "Entities.draw", "MainMenu.draw", "Button.draw", "Particle.draw",
+               "ParallaxLayer", "draw_text", "mario_frames", "FrameProfiler.draw"),
+}
+_SUBSYSTEM_OF = {name: sub for sub, names in SUBSYSTEMS.items() for name in names}
+_CODE_SUBSYSTEM = {}
+
+def _qualname(code):
+    # co_qualname is new in 3.11; older code objects only know the bare name
+    return getattr(code, "co_qualname", code.co_name)
+
+def subsystem_of(code):
+    sub = _CODE_SUBSYSTEM.get(code, False)
+    if sub is False:
+        sub = None
+        if code.co_filename == __file__:
+            qualname = _qualname(code)
+            sub = _SUBSYSTEM_OF.get(qualname) or _SUBSYSTEM_OF.get(qualname.split(".")[0])
+        _CODE_SUBSYSTEM[code] = sub
+    return sub
+
+class EngineProfiler:
+    """Opt-in profiling of the state loop, in one of two modes.
+
+    By default cProfile records exact per-function costs for <prefix>.pstats.
+    With `sample`, a thread instead snapshots the main thread's stack every
+    `interval` seconds for <prefix>.collapsed (flamegraph.pl / speedscope
+    input) and attributes each sample to the innermost frame with a known
+    subsystem. The modes never run together: cProfile's per-call overhead
+    would skew the samples towards call-heavy code.
+    """
+    def __init__(self, prefix, sample=False, interval=0.001):
+        self.prefix = prefix
+        self.sample = sample
+        self.interval = interval
+        self.stacks = {}
+        self.subsystems = {}
+    def __enter__(self):
+        if self.sample:
+            self.target = threading.get_ident()
+            self.stop = threading.Event()
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+        else:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+    def _sample(self):
+        stacks, subsystems = self.stacks, self.subsystems
+        while not self.stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            names, sub = [], None
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{_qualname(code)}")
+                if sub is None:
+                    sub = subsystem_of(code)
+                frame = frame.f_back
+            if names:
+                key = ";".join(reversed(names))
+                stacks[key] = stacks.get(key, 0) + 1
+                sub = sub or "other"
+                subsystems[sub] = subsystems.get(sub, 0) + 1
+    def __exit__(self, *exc):
+        if not self.sample:
+            self.profile.disable()
+            self.profile.dump_stats(self.prefix + ".pstats")
+            print(f"profile: -> {self.prefix}.pstats")
+            return False
+        self.stop.set()
+        self.thread.join()
+        with open(self.prefix + ".collapsed", "w") as f:
+            for key, count in sorted(self.stacks.items()):
+                f.write(f"{key} {count}\n")
+        total = sum(self.subsystems.values()) or 1
+        print(f"profile: {total} samples -> {self.prefix}.collapsed")
+        for sub, count in sorted(self.subsystems.items(), key=lambda kv: -kv[1]):
+            print(f"  {sub:<10}{100 * count / total:6.1f}%")
+        return False
+
+# --- Benchmarks ---
+BENCH_LEVEL_COLUMNS = (64, 1024, 8192, 50000)
+BENCH_PARTICLES = (40, 1000, 10000)
+
+def bench_grid(cols, rows=9):
+    """Deterministic synthetic level: ground, platforms, coins and enemies."""
+    grid = []
+    for y in range(rows):
+        if y == rows - 1:
+            grid.append("#" * cols)
+        elif y in (3, 5):
+            grid.append("".join("#" if (x // 4 + y) % 5 == 0 else "." for x in range(cols)))
+        elif y == rows - 2:
+            grid.append("".join("E" if x % 48 == 24 else "." for x in range(cols)))
+        else:
+            grid.append("".join("C" if (x * 7 + y) % 23 == 0 else "." for x in range(cols)))
+    grid[rows - 2] = grid[rows - 2][:-2] + "F."
+    return grid
+
+def _bench_cases():
+    """(name, size, setup) triples; setup(size) returns the callable to time."""
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    def level_init(n):
+        grid = bench_grid(n)
+        return lambda: Level(grid)
+    def player_update(n):
+        level = Level(bench_grid(n))
+        player = Player((TILE * 2, 0))
+        def run():
+            player.update(level.cols)
+        return run
+    def level_draw(n):
+        level, camera = Level(bench_grid(n)), Camera()
+        camera.move_to(n * TILE // 2, 0)
+        return lambda: level.draw(screen, camera)
+    def set_tile(n):
+        level, c = Level(bench_grid(n)), n // 2
+        def run():
+            level.set_tile(c, 2, TILE_IDS["B"])
+            level.set_tile(c, 2, AIR)
+            level.changes.clear()
+        return run
+    def restart(n):
+        game = GameEngine(headless=True)
+        game.load_level(bench_grid(n))
+        return game.restart
+    def worlds(n):
+        def run():
+            auto_worlds([], worlds=1, levels_each=1, length=n)
+        return run
+    def menu_draw(n):
+        menu = MainMenu()
+        menu.particles = [Particle() for _ in range(n)]
+        return menu.draw
+    textures = []
+    def texture_display():
+        if not textures:
+            textures.append(TextureDisplay((WIDTH, HEIGHT), fullscreen=False))
+        return textures[0]
+    def level_draw_sdl2(n):
+        display = texture_display()
+        level, camera = Level(bench_grid(n)), Camera()
+        camera.move_to(n * TILE // 2, 0)
+        def run():
+            level.draw(display.target(GAME_VIEW), camera)
+            display.flip()
+        return run
+    def menu_draw_sdl2(n):
+        menu = MainMenu(texture_display())
+        menu.particles = [Particle() for _ in range(n)]
+        def run():
+            menu.draw()
+            menu.display.flip()
+        return run
+    cases = [("generate_tone", ms, lambda ms: lambda: generate_tone(440, ms)) for ms in (100, 1000)]
+    cases.append(("create_simple_ost", 8, lambda n: create_simple_ost))
+    cases += [("auto_worlds", n, worlds) for n in (64, 1024, 8192)]
+    cases += [("Level.__init__", n, level_init) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("Player.update", n, player_update) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("Level.draw", n, level_draw) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("Level.set_tile", n, set_tile) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("GameEngine.restart", n, restart) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("draw_text", n, lambda n: lambda: draw_text("K" * n, 28, PAL["text_brown"], 0, 0))
+              for n in (12, 120)]
+    cases += [("MainMenu.draw", n, menu_draw) for n in BENCH_PARTICLES]
+    cases += [("Level.draw.sdl2", n, level_draw_sdl2) for n in BENCH_LEVEL_COLUMNS]
+    cases += [("MainMenu.draw.sdl2", n, menu_draw_sdl2) for n in BENCH_PARTICLES]
+    def present(n):
+        display = Display((WIDTH, HEIGHT), fullscreen=False)
+        buf = display.target((WIDTH // n, HEIGHT // n))
+        return lambda: display.present(buf)
+    cases += [("Display.present", n, present) for n in (2, 4)]
+    def vec_env(n):
+        env = VecKoopaEnv(n, seed=0)
+        env.reset()
+        actions = [IN_RIGHT | IN_JUMP] * n
+        return lambda: env.step(actions)
+    if np is not None:
+        cases += [("VecKoopaEnv.step", n, vec_env) for n in (1, 64)]
+    return cases
+
+def run_benchmarks(min_time=0.1, repeat=9, only=None):
+    """Time every case; returns (median seconds per call, relative spread),
+    both keyed "name[size]". The spread is the interquartile range of the
+    repeats over their median."""
+    startup()
+    results, spread = {}, {}
+    for name, size, setup in _bench_cases():
+        key = f"{name}[{size}]"
+        if only and only not in key:
+            continue
+        fn = setup(size)
+        fn()  # warm caches
+        times = []
+        gc.disable()  # as timeit does: collections land on whichever case allocates next
+        try:
+            for _ in range(repeat):
+                calls, start = 0, time.perf_counter()
+                while True:
+                    fn()
+                    calls += 1
+                    elapsed = time.perf_counter() - start
+                    if elapsed >= min_time:
+                        break
+                times.append(elapsed / calls)
+        finally:
+            gc.enable()
+        times.sort()
+        median = times[len(times) // 2]
+        results[key] = median
+        spread[key] = (times[len(times) * 3 // 4] - times[len(times) // 4]) / median
+        print(f"{key:<28}{median*1e3:>12.4f} ms{1/median:>14.1f} /s  ±{spread[key]:.0%}",
+              file=sys.stderr)
+    return results, spread
+
+def compare_benchmarks(results, baseline, tolerance=0.25, spread=None):
+    """Print current vs baseline times; returns the keys that got slower.
+
+    A case only counts as slower past `tolerance` plus its own measured
+    spread in either run, so noisy cases need a bigger change to fail.
+    """
+    slower = []
+    for key, sec in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = sec / base
+        flag = ""
+        if ratio > 1 + tolerance + (spread or {}).get(key, 0):
+            flag = "  REGRESSION"
+            slower.append(key)
+        print(f"{key:<28}{base*1e3:>10.4f} -> {sec*1e3:>10.4f} ms  x{ratio:5.2f}{flag}")
+    return slower
+
+# --- Simulation Farm ---
+FARM_MAX_TICKS = 60 * FPS
+FARM_LIVES = 3
+
+def _policy_right(grid, rng):
+    while True:
+        yield IN_RIGHT | IN_JUMP
+
+def _policy_random(grid, rng):
+    choices = (IN_RIGHT, IN_RIGHT | IN_JUMP, IN_RIGHT | IN_JUMP, IN_LEFT, IN_JUMP, 0)
+    while True:
+        inp = rng.choice(choices)
+        for _ in range(rng.randint(4, 30)):
+            yield inp
+
+def _policy_solver(grid, rng):
+    yield from analyze_level(grid) or ()
+    yield from _policy_right(grid, rng)
+
+FARM_POLICIES = {"right": _policy_right, "random": _policy_random, "solver": _policy_solver}
+
+_FARM_GAME = None
+
+def _farm_init(fixed=None):
+    global _FARM_GAME, FIXED_POINT
+    if fixed is not None:
+        FIXED_POINT = fixed
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    startup(audio=False)
+    _FARM_GAME = GameEngine(headless=True)
+
+def farm_episode(task):
+    """Play one level headlessly; task is {"name", "grid", "policy", "seed"}."""
+    if _FARM_GAME is None:
+        _farm_init()
+    game, grid = _FARM_GAME, task["grid"]
+    rng = random.Random(task["seed"])
+    policy = FARM_POLICIES[task["policy"]]
+    inputs = policy(grid, rng)
+    game.deaths = 0
+    game.load_level(grid)
+    result, ticks, stepping = None, 0, 0.0
+    started = time.time()
+    while ticks < FARM_MAX_TICKS:
+        inp = next(inputs)  # the solver plans here, which is not engine time
+        t = time.perf_counter()
+        result = game.step(inp)
+        stepping += time.perf_counter() - t
+        ticks += 1
+        if result == "flag":
+            break
+        if result == "death":
+            if game.deaths >= FARM_LIVES:
+                break
+            game.restart()
+            inputs = policy(grid, rng)
+    finished = time.time()
+    return {"name": task["name"], "policy": task["policy"], "seed": task["seed"],
+            "completed": result == "flag", "ticks": ticks,
+            "seconds": ticks / FPS if result == "flag" else None,
+            "coins": game.coins, "deaths": game.deaths,
+            "ticks_per_s": ticks / max(stepping, 1e-9),
+            "started": started, "finished": finished, "pid": os.getpid()}
+
+def farm_tasks(runs, policy="solver", seed=0, generated=False, length=60):
+    """Build `runs` episodes cycling through WORLD_DATA, or seeded generated levels."""
+    levels = [(f"W{wi+1}-{li+1}", grid) for wi, world in enumerate(WORLD_DATA)
+              for li, grid in enumerate(world)]
+    tasks = []
+    for i in range(runs):
+        if generated:
+            name, grid = f"seed{seed + i}", _random_level(length, random.Random(seed + i))
+        else:
+            name, grid = levels[i % len(levels)]
+        tasks.append({"name": name, "grid": grid, "policy": policy, "seed": seed + i})
+    return tasks
+
+def run_farm(tasks, workers=None):
+    """Run episodes across a process pool; returns (results, summary)."""
+    import multiprocessing
+    workers = workers or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_farm_init, initargs=(FIXED_POINT,)) as pool:
+        results = pool.map(farm_episode, tasks, chunksize=1)
+        # SDL traps SIGTERM in the workers, so let them exit instead of terminate()
+        pool.close()
+        pool.join()
+    wall = max(r["finished"] for r in results) - min(r["started"] for r in results)
+    done = [r["seconds"] for r in results if r["completed"]]
+    ticks = sum(r["ticks"] for r in results)
+    summary = {"workers": workers, "episodes": len(results), "completed": len(done),
+               "mean_completion_s": sum(done) / len(done) if done else None,
+               "coins": sum(r["coins"] for r in results),
+               "deaths": sum(r["deaths"] for r in results),
+               "ticks": ticks, "wall_s": wall, "ticks_per_s": ticks / max(wall, 1e-9),
+               "ticks_per_s_per_episode": sum(r["ticks_per_s"] for r in results) / len(results)}
+    return results, summary
+
+def farm_report(results, summary):
+    for r in results:
+        status = f"{r['seconds']:6.2f} s" if r["completed"] else "  failed"
+        print(f"{r['name']:<12}{r['policy']:<8}{status}{r['coins']:>4} coins"
+              f"{r['deaths']:>3} deaths{r['ticks_per_s']:>10.0f} ticks/s")
+    mean = summary["mean_completion_s"]
+    print(f"{summary['completed']}/{summary['episodes']} completed"
+          + (f", mean {mean:.2f} s" if mean is not None else "")
+          + f", {summary['coins']} coins, {summary['deaths']} deaths")
+    print(f"{summary['workers']} workers: {summary['ticks']} ticks in {summary['wall_s']:.2f} s"
+          f" = {summary['ticks_per_s']:.0f} ticks/s"
+          f" ({summary['ticks_per_s_per_episode']:.0f} per episode)")
+
+# --- Environment API ---
+OBS_EMPTY, OBS_SOLID, OBS_COIN, OBS_FLAG, OBS_ENEMY, OBS_PLAYER, OBS_HAZARD, OBS_PLATFORM = range(8)
+_TILE_OBS = bytes(OBS_SOLID if f & T_SOLID else OBS_PLATFORM if f & T_ONE_WAY
+                  else OBS_HAZARD if f & T_HAZARD else OBS_COIN if f & T_COLLECT else OBS_EMPTY
+                  for f in TILE_FLAGS)
+
+class KoopaEnv:
+    """Gym-style stepping API over a headless GameEngine.
+
+    Actions are IN_LEFT/IN_RIGHT/IN_JUMP bitmasks. Observations are either a
+    uint8 OBS_* tile window of `rows` x `cols` centred on the player
+    ("tiles"), or the rendered scene downscaled to `frame_size` as an
+    (h, w, 3) uint8 array ("pixels"). Rewards are columns of progress, plus
+    one per coin, +10 at the flag and -5 for falling out.
+    """
+    def __init__(self, obs="tiles", rows=9, cols=17, frame_size=(80, 60),
+                 max_ticks=FARM_MAX_TICKS):
+        if np is None:
+            raise ImportError("KoopaEnv needs numpy")
+        startup(audio=False)
+        self.game = GameEngine(headless=True)
+        self.obs_type = obs
+        self.rows, self.cols = rows, cols
+        self.max_ticks = max_ticks
+        if obs == "pixels":
+            self.canvas = pygame.Surface(GAME_VIEW)
+            self.small = pygame.Surface(frame_size)
+            self.shape = (frame_size[1], frame_size[0], 3)
+        else:
+            self.shape = (rows, cols)
+        self.obs = np.zeros(self.shape, np.uint8)
+        self.ticks = 0
+        self.reset()
+
+    def reset(self, seed=None, world=None, level=None, out=None):
+        """Load WORLD_DATA[world][level], or the level generated from `seed`."""
+        if world is not None:
+            grid = WORLD_DATA[world][level or 0]
+        elif seed is not None:
+            grid = _random_level(60, random.Random(seed))
+        else:
+            grid = WORLD_DATA[0][level or 0]
+        game = self.game
+        game.deaths = 0
+        game.load_level(grid)
+        self.ticks = 0
+        if self.obs_type == "tiles":
+            self._build_layer()
+        return self._observe(self.obs if out is None else out)
+
+    def step(self, action, out=None):
+        """Advance one tick; returns (observation, reward, done)."""
+        game = self.game
+        x, coins = game.player.rect.x, game.coins
+        result = game.step(action)
+        self.ticks += 1
+        reward = (game.player.rect.x - x) / TILE + game.coins - coins
+        if game.level_obj.changes and self.obs_type == "tiles":
+            self._apply_changes()
+        done = result is not None or self.ticks >= self.max_ticks
+        if result == "flag":
+            reward += 10
+        elif result == "death":
+            reward -= 5
+        return self._observe(self.obs if out is None else out), reward, done
+
+    def _build_layer(self):
+        # static tiles padded so any player column yields an in-bounds window
+        level = self.game.level_obj
+        half, rows = self.cols // 2, self.rows
+        self.top = rows - level.h
+        layer = self.layer = np.zeros((rows, level.w + 2 * half), np.uint8)
+        ids = np.frombuffer(b"".join(level.cols), np.uint8).reshape(level.w, level.h).T
+        tiles = np.frombuffer(_TILE_OBS, np.uint8)[ids[max(-self.top, 0):]]
+        layer[max(self.top, 0):, half:half + level.w] = tiles
+        if level.flag:
+            fx, fy = level.flag.x // TILE + half, level.flag.y // TILE + self.top
+            layer[max(fy, 0):max(fy + 2, 0), fx] = OBS_FLAG
+
+    def _apply_changes(self):
+        layer, half = self.layer, self.cols // 2
+        for _, c, r, _, t in self.game.level_obj.changes:
+            y = r + self.top
+            if y >= 0:
+                layer[y, c + half] = _TILE_OBS[t]
+
+    def _observe(self, out):
+        game = self.game
+        if self.obs_type == "pixels":
+            game.draw_scene(self.canvas)
+            pygame.transform.scale(self.canvas, self.small.get_size(), self.small)
+            out[...] = pygame.surfarray.pixels3d(self.small).transpose(1, 0, 2)
+            return out
+        rect, cols, rows = game.player.rect, self.cols, self.rows
+        start = min(max(rect.centerx // TILE, 0), self.layer.shape[1] - cols)
+        out[...] = self.layer[:, start:start + cols]
+        c0 = start - cols // 2  # level column at the window's left edge
+        enemies = game.level_obj.enemies
+        if enemies is not None and enemies.n:
+            n = enemies.n
+            ex = ((enemies.x[:n] + enemies.w[:n] / 2) // TILE).astype(np.intp) - c0
+            ey = ((enemies.y[:n] + enemies.h[:n] / 2) // TILE).astype(np.intp) + self.top
+            keep = (ex >= 0) & (ex < cols) & (ey >= 0) & (ey < rows)
+            out[ey[keep], ex[keep]] = OBS_ENEMY
+        px, py = rect.centerx // TILE - c0, rect.centery // TILE + self.top
+        if 0 <= px < cols and 0 <= py < rows:
+            out[py, px] = OBS_PLAYER
+        return out
+
+class VecKoopaEnv:
+    """N KoopaEnvs stepped in lockstep into shared preallocated arrays.
+
+    Finished environments reset themselves; with `seed` set each new
+    episode plays the next generated level, otherwise the same level again.
+    """
+    def __init__(self, n, seed=None, world=None, level=None, **kwargs):
+        self.envs = [KoopaEnv(**kwargs) for _ in range(n)]
+        self.obs = np.zeros((n,) + self.envs[0].shape, np.uint8)
+        self.rewards = np.zeros(n)
+        self.dones = np.zeros(n, bool)
+        self.seed, self.world, self.level = seed, world, level
+        self.episodes = 0
+
+    def _reset_env(self, i):
+        seed = None
+        if self.seed is not None:
+            seed = self.seed + self.episodes
+        self.episodes += 1
+        self.envs[i].reset(seed, self.world, self.level, out=self.obs[i])
+
+    def reset(self):
+        self.episodes = 0
+        for i in range(len(self.envs)):
+            self._reset_env(i)
+        return self.obs
+
+    def step(self, actions):
+        """Step every env with its action; returns (obs, rewards, dones) arrays."""
+        obs, rewards, dones = self.obs, self.rewards, self.dones
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            _, rewards[i], dones[i] = env.step(int(action), out=obs[i])
+            if dones[i]:
+                self._reset_env(i)
+        return obs, rewards, dones
+
+STARTUP_TIMES.append(("import", time.perf_counter() - _IMPORT_START))
 
 # --- Main Execution ---
+def run_states(menu=None):
+    scenes = SceneManager(menu.display if menu else None)
+    if menu:
+        scenes.add("menu", menu)
+    scenes.run("menu")
+    scenes.close()
+
 if __name__ == "__main__":
-    current_state = "menu"
-    while True:
-        if current_state == "menu":
+    import argparse
+    parser = argparse.ArgumentParser(description="NSMB2 Koopa Engine")
+    parser.add_argument("--check-levels", action="store_true",
+                        help="verify every level can be finished and exit")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="compare object sizes and attribute speed and exit")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="record gameplay frames: PATH.raw for raw RGB24 video, "
+                             "otherwise a directory of PNGs (with --renderer sdl2 each "
+                             "recorded frame is a blocking GPU readback)")
+    parser.add_argument("--keymap", metavar="FILE",
+                        help='JSON key rebinding, e.g. {"jump": ["z", "space"]}')
+    parser.add_argument("--record", metavar="FILE",
+                        help="save the game's per-tick inputs for --replay")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="drive the player from inputs saved with --record")
+    parser.add_argument("--input-stats", action="store_true",
+                        help="print input-to-screen latency when the game exits")
+    parser.add_argument("--window", metavar="WxH",
+                        help="window size; the picture is integer-scaled to fit (default 800x600)")
+    parser.add_argument("--fullscreen", action="store_true",
+                        help="fill the desktop, scaling the picture to fit")
+    parser.add_argument("--renderer", choices=("software", "sdl2"), default="software",
+                        help="draw with Surface blits, or as textures through pygame._sdl2 "
+                             "(OpenGL where available, else SDL's software renderer)")
+    parser.add_argument("--fixed-point", action="store_true",
+                        help="integer sub-pixel physics, bit-exact across machines")
+    parser.add_argument("--frame-stats", metavar="FILE",
+                        help="write per-phase frame times (.csv or .json) when a scene exits")
+    parser.add_argument("--bench", nargs="?", const="-", metavar="OUT.json",
+                        help="run the headless benchmark suite, writing results as JSON")
+    parser.add_argument("--bench-filter", metavar="TEXT",
+                        help="only run benchmarks whose name contains TEXT")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="with --bench, fail if anything is slower than this saved run "
+                             "(timings are machine-specific: save the baseline on the same host)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against --baseline (default 0.25 = 25%%)")
+    parser.add_argument("--headless", action="store_true",
+                        help="use SDL's dummy video and audio drivers")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each startup phase took")
+    parser.add_argument("--farm", type=int, metavar="RUNS",
+                        help="play RUNS headless episodes across a process pool and report")
+    parser.add_argument("--farm-policy", choices=sorted(FARM_POLICIES), default="solver",
+                        help="input policy for --farm episodes (default solver)")
+    parser.add_argument("--farm-generated", action="store_true",
+                        help="with --farm, play seeded generated levels instead of WORLD_DATA")
+    parser.add_argument("--farm-report", metavar="FILE",
+                        help="with --farm, also write per-episode results and totals as JSON")
+    parser.add_argument("--workers", type=int,
+                        help="processes for --farm (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base seed for --farm levels and random inputs")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="profile the game with cProfile, writing PREFIX.pstats on exit "
+                             "(or set KOOPA_PROFILE=PREFIX)")
+    parser.add_argument("--profile-sample", action="store_true",
+                        help="with --profile, sample stacks every 1 ms instead, writing "
+                             "PREFIX.collapsed and a per-subsystem breakdown")
+    args = parser.parse_args()
+    FRAME_STATS_PATH = args.frame_stats
+    CAPTURE_PATH = args.capture
+    FIXED_POINT = args.fixed_point
+    FULLSCREEN = args.fullscreen
+    RENDERER = args.renderer
+    if args.window:
+        WINDOW_SIZE = tuple(int(v) for v in args.window.lower().split("x"))
+    RECORD_PATH, REPLAY_PATH, INPUT_STATS = args.record, args.replay, args.input_stats
+    if args.headless or args.bench or args.check_levels or args.memory_report or args.farm:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    if args.farm:
+        random.seed(args.seed)  # generated worlds must match between farm runs
+    startup()
+    if args.keymap:
+        INPUT.load_keymap(args.keymap)
+    if args.bench:
+        import platform
+        results, spread = run_benchmarks(only=args.bench_filter)
+        report = {"python": platform.python_version(), "pygame": pygame.version.ver,
+                  "results": results, "spread": spread}
+        if args.bench == "-":
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.bench, "w") as f:
+                json.dump(report, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            # either run's noise widens the margin
+            noise = {k: max(v, saved.get("spread", {}).get(k, 0)) for k, v in spread.items()}
+            sys.exit(1 if compare_benchmarks(results, saved["results"], args.tolerance, noise) else 0)
+        sys.exit()
+    if args.farm:
+        results, summary = run_farm(farm_tasks(args.farm, args.farm_policy, args.seed,
+                                               args.farm_generated), args.workers)
+        farm_report(results, summary)
+        if args.farm_report:
+            with open(args.farm_report, "w") as f:
+                json.dump({"summary": summary, "episodes": results}, f, indent=2)
+        sys.exit()
+    if args.check_levels:
+        sys.exit(0 if check_levels(WORLD_DATA) else 1)
+    if args.memory_report:
+        memory_report()
+        sys.exit()
+    menu = None
+    if args.startup_report:
+        with startup_phase("menu"):
             menu = MainMenu()
-            current_state = menu.run()
-        elif current_state == "game":
-            if OST_THEME:
-                OST_THEME.stop()
-            game = GameEngine()
-            current_state = game.run()
+        with startup_phase("first frame"):
+            menu.draw()
+            menu.display.present(menu.screen)
+            menu.display.flip()
+        startup_report()
+    profile_prefix = args.profile or os.environ.get("KOOPA_PROFILE")
+    try:
+        if profile_prefix:
+            with EngineProfiler(profile_prefix, sample=args.profile_sample):
+                run_states(menu)
         else:
-            break
+            run_states(menu)
+    finally:  # closing the window exits from inside the scene
+        if _CAPTURE:
+            print(_CAPTURE[0].close())
     if OST_THEME:
         OST_THEME.stop()
     pygame.quit()
@@ -1,11 +1,47 @@
 # test.py
+import time
+_IMPORT_START = time.perf_counter()
 import pygame, sys, math, itertools, random
 import io # Needed for sound buffer
+import contextlib
 
-# --- Sound Engine Initialization ---
-pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
-pygame.init()
-pygame.mixer.init() # Initialize the mixer after pre_init
+# --- Startup ---
+# Nothing expensive happens at import time; startup() initialises pygame and
+# builds sounds, tiles and worlds on first use, timing each step.
+STARTUP_TIMES = []
+_STARTED = False
+
+@contextlib.contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMES.append((name, time.perf_counter() - start))
+
+def startup():
+    """Run the expensive one-time setup; later calls do nothing."""
+    global _STARTED
+    if _STARTED:
+        return
+    _STARTED = True
+    with startup_phase("pygame.init"):
+        # --- Sound Engine Initialization ---
+        pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
+        pygame.init()
+        pygame.mixer.init() # Initialize the mixer after pre_init
+    with startup_phase("sounds"):
+        load_sounds()
+    with startup_phase("tiles"):
+        load_tiles()
+    with startup_phase("worlds"):
+        auto_worlds(WORLD_DATA)
+
+def startup_report():
+    total = sum(t for _, t in STARTUP_TIMES)
+    for name, t in STARTUP_TIMES:
+        print(f"{name:<14}{t*1000:9.1f} ms")
+    print(f"{'total':<14}{total*1000:9.1f} ms")
 
 # --- Constants ---
 WIDTH, HEIGHT = 800, 600
@@ -58,50 +94,54 @@ def generate_tone(frequency, duration_ms, volume=0.2):
 
     return pygame.mixer.Sound(buffer=stereo_buf)
 
+# Simple background music (looping arpeggio)
+def create_simple_ost():
+    # Frequencies for a C major arpeggio (C-E-G-C-E-G-C-E...)
+    notes = [261.63, 329.63, 392.00, 523.25, 659.25, 783.99, 1046.50, 1318.51]
+    note_duration = 150 # ms per note
+    music_buffer = bytearray()
+
+    sample_rate = 22050
+    max_amplitude = int(32767 * 0.15) # Lower volume for background
+
+    for freq in notes:
+        n_samples = int(round(note_duration * sample_rate / 1000.0))
+        for i in range(n_samples):
+            t = float(i) / sample_rate
+            wave = math.sin(2.0 * math.pi * freq * t)
+            value = int(wave * max_amplitude)
+            music_buffer += value.to_bytes(2, byteorder='little', signed=True)
+
+    # Create stereo
+    stereo_music_buffer = bytearray()
+    for i in range(0, len(music_buffer), 2):
+        sample_bytes = music_buffer[i:i+2]
+        stereo_music_buffer += sample_bytes + sample_bytes
+
+    sound = pygame.mixer.Sound(buffer=stereo_music_buffer)
+    sound.set_volume(0.5) # Further reduce volume
+    return sound
+
 # --- Create Sound Effects ---
-try:
-    # Button hover sound (higher pitch)
-    SFX_HOVER = generate_tone(660, 100) # ~ E5
-    # Button click/press sound (lower pitch)
-    SFX_CLICK = generate_tone(440, 120) # ~ A4
-    # Coin collect sound (ascending pitch)
-    SFX_COIN_SOUND = generate_tone(1320, 120) # ~ C6
-    # Jump sound
-    SFX_JUMP_SOUND = generate_tone(880, 120)  # ~ A5
-
-    # Simple background music (looping arpeggio)
-    def create_simple_ost():
-        # Frequencies for a C major arpeggio (C-E-G-C-E-G-C-E...)
-        notes = [261.63, 329.63, 392.00, 523.25, 659.25, 783.99, 1046.50, 1318.51]
-        note_duration = 150 # ms per note
-        music_buffer = bytearray()
-
-        sample_rate = 22050
-        max_amplitude = int(32767 * 0.15) # Lower volume for background
-
-        for freq in notes:
-            n_samples = int(round(note_duration * sample_rate / 1000.0))
-            for i in range(n_samples):
-                t = float(i) / sample_rate
-                wave = math.sin(2.0 * math.pi * freq * t)
-                value = int(wave * max_amplitude)
-                music_buffer += value.to_bytes(2, byteorder='little', signed=True)
-
-        # Create stereo
-        stereo_music_buffer = bytearray()
-        for i in range(0, len(music_buffer), 2):
-            sample_bytes = music_buffer[i:i+2]
-            stereo_music_buffer += sample_bytes + sample_bytes
-
-        sound = pygame.mixer.Sound(buffer=stereo_music_buffer)
-        sound.set_volume(0.5) # Further reduce volume
-        return sound
-
-    OST_THEME = create_simple_ost()
-
-except Exception as e:
-    print(f"Warning: Error generating sounds: {e}")
-    SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
+SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
+
+def load_sounds():
+    global SFX_HOVER, SFX_CLICK, SFX_COIN_SOUND, SFX_JUMP_SOUND, OST_THEME
+    try:
+        # Button hover sound (higher pitch)
+        SFX_HOVER = generate_tone(660, 100) # ~ E5
+        # Button click/press sound (lower pitch)
+        SFX_CLICK = generate_tone(440, 120) # ~ A4
+        # Coin collect sound (ascending pitch)
+        SFX_COIN_SOUND = generate_tone(1320, 120) # ~ C6
+        # Jump sound
+        SFX_JUMP_SOUND = generate_tone(880, 120)  # ~ A5
+
+        OST_THEME = create_simple_ost()
+
+    except Exception as e:
+        print(f"Warning: Error generating sounds: {e}")
+        SFX_HOVER = SFX_CLICK = SFX_COIN_SOUND = SFX_JUMP_SOUND = OST_THEME = None
 
 
 # --- Graphics Helpers ---
@@ -170,12 +210,15 @@ def draw_text(text, size, color, x, y, center=True):
     return text_surface, text_rect
 
 # --- Game Data ---
-IMG = {
-    "#": solid(PAL["brick"]),
-    "G": solid(PAL["grass_green"]), # Use NSMB2 green
-    "C": solid(PAL["coin_yellow"]), # Use NSMB2 yellow
-    "F": solid(PAL["flag"]),
-}
+IMG = {} # Filled by startup()
+
+def load_tiles():
+    IMG.update({
+        "#": solid(PAL["brick"]),
+        "G": solid(PAL["grass_green"]), # Use NSMB2 green
+        "C": solid(PAL["coin_yellow"]), # Use NSMB2 yellow
+        "F": solid(PAL["flag"]),
+    })
 
 WORLD_DATA = [
   [  # world 1
@@ -228,7 +271,6 @@ def auto_worlds(base_worlds, worlds=5, levels_each=3, length=60):
             rows[0] = rows[0][:length-2]+"F."
             w.append(rows)
         base_worlds.append(w)
-auto_worlds(WORLD_DATA)
 
 
 # --- Menu Classes ---
@@ -320,6 +362,7 @@ class Particle:
 
 class MainMenu:
     def __init__(self):
+        startup()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("NSMB2 Koopa Engine")
         self.clock = pygame.time.Clock()
@@ -535,6 +578,7 @@ class Camera:
 
 class GameEngine:
     def __init__(self):
+        startup()
         self.screen = pygame.display.set_mode((WIDTH,HEIGHT))
         pygame.display.set_caption("Python Mario Vibes")
         self.clock = pygame.time.Clock()
@@ -597,13 +641,25 @@ class GameEngine:
         return "menu"
 
 
+STARTUP_TIMES.append(("import", time.perf_counter() - _IMPORT_START))
+
 # --- Main Execution ---
 if __name__ == "__main__":
+    menu = None
+    if "--startup-report" in sys.argv:
+        startup()
+        with startup_phase("menu"):
+            menu = MainMenu()
+        with startup_phase("first frame"):
+            menu.draw()
+            pygame.display.flip()
+        startup_report()
     current_state = "menu"
     while True:
         if current_state == "menu":
-            menu = MainMenu()
+            menu = menu or MainMenu()
             current_state = menu.run()
+            menu = None
         elif current_state == "game":
             # Stop menu music when starting game
             if OST_THEME:
@@ -614,7 +670,7 @@ if __name__ == "__main__":
             break # Exit if unknown state
 
     # Ensure music stops on exit
-    if OST_THEMaE:
+    if OST_THEME:
         OST_THEME.stop()
     pygame.quit()
     sys.exit()
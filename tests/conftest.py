@@ -0,0 +1,21 @@
+import glob
+import importlib.util
+import os
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def k():
+    # the engine's file name isn't importable, so load it by path
+    path, = glob.glob(os.path.join(ROOT, "*koopaengine*.py"))
+    spec = importlib.util.spec_from_file_location("koopaengine", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.startup(audio=False)
+    return module
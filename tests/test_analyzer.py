@@ -0,0 +1,64 @@
+import random
+
+
+def _replay(k, grid, inputs):
+    level = k.Level(grid)
+    player = k.Player(level.spawn)
+    for i, held in enumerate(inputs):
+        player.update(level.cols, held)
+        if level.flag and player.rect.colliderect(level.flag):
+            return i + 1
+    return None
+
+
+def _brute_force(k, grid):
+    # every input on every tick, through the same physics as the analyzer
+    h, T = len(grid), k.TILE
+    cols = [bytes(len(grid))] * 8 + k.level_columns(grid) + [bytes(len(grid))] * 8
+    x, y = k.find_spawn(grid)
+    seen = {(x + 8 * T, y, 0.0, False)}
+    frontier = list(seen)
+    while frontier:
+        nxt = []
+        for state in frontier:
+            for held in (0, 1, 2, 4, 5, 6):
+                s = k._sim_step(cols, h, *state, held)
+                if s in seen:
+                    continue
+                seen.add(s)
+                if k._touches_flag(cols, h, s[0], s[1]):
+                    return True
+                if s[1] <= h * T and not k.tile_flags_under(
+                        cols, h, s[0], k._round(s[1]), T, T) & k.T_HAZARD:
+                    nxt.append(s)
+        frontier = nxt
+    return False
+
+
+def _layout(rng, w=12, h=5):
+    rows = ["".join("#" if rng.random() < 0.15 else "." for _ in range(w)) for _ in range(h - 1)]
+    rows.append("".join("#" if rng.random() < 0.8 else "." for _ in range(w)))
+    rows[1] = rows[1][:w - 2] + "F" + rows[1][w - 1:]
+    return rows
+
+
+def test_solver_paths_replay_to_the_flag(k):
+    rng = random.Random(1)
+    grids = k.WORLD_DATA[0] + [k._random_level(60, rng) for _ in range(50)]
+    for grid in grids:
+        path = k.analyze_level(grid)
+        assert path is not None
+        assert _replay(k, grid, path) == len(path)
+
+
+def test_analyzer_agrees_with_brute_force(k):
+    # includes levels that need a jump from mid-tile or a turn in the air
+    rng = random.Random(3)
+    grids = [["................", "..#...........F.", "...#............",
+              "...........#....", "................", "####..##########"]]
+    grids += [_layout(rng) for _ in range(20)]
+    for grid in grids:
+        path = k.analyze_level(grid)
+        assert (path is not None) == _brute_force(k, grid), grid
+        if path is not None:
+            assert _replay(k, grid, path) == len(path)
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture
+def assets(k):
+    # a 1-pixel-high surface of n pixels: 4n bytes resident
+    return lambda budget: k.AssetManager({"blob": lambda n: k.pygame.Surface((n, 1), 0, 32)}, budget)
+
+
+def test_acquire_shares_and_refcounts(assets):
+    manager = assets(1 << 20)
+    a = manager.acquire("blob", 10)
+    assert manager.acquire("blob", 10) is a
+    assert (manager.builds, manager.hits, manager.refs[("blob", 10)]) == (1, 1, 2)
+    manager.release("blob", 10)
+    manager.release("blob", 10)
+    # unreferenced but under budget: kept for the next request
+    assert ("blob", 10) not in manager.refs and manager.get("blob", 10) is a
+    assert manager.builds == 1
+
+
+def test_eviction_drops_least_recently_used_idle_assets(assets):
+    manager = assets(200)
+    held = manager.acquire("blob", 5)  # 20 bytes, never evicted
+    for n in (10, 11, 12):  # 40, 44 and 48 bytes, all idle
+        manager.get("blob", n)
+    manager.get("blob", 10)  # touch: now the most recently used
+    manager.get("blob", 30)  # 120 bytes pushes the total to 272
+    assert set(manager.assets) == {("blob", 5), ("blob", 10), ("blob", 30)}
+    assert manager.evictions == 2 and manager.resident == 180
+    assert manager.get("blob", 5) is held
@@ -0,0 +1,41 @@
+import pytest
+
+
+def _at(k, cx, cy):
+    rect = k.pygame.Rect(0, 0, k.TILE, k.TILE)
+    rect.center = (cx, cy)
+    return rect
+
+
+def test_target_inside_the_deadzone_keeps_the_camera_still(k):
+    camera = k.Camera((3200, 1200))
+    camera.follow(_at(k, 230, 300), 1)
+    assert (camera.x, camera.y) == (0, 0)
+
+
+def test_camera_follows_past_the_deadzone_and_stops_at_bounds(k):
+    camera = k.Camera((3200, 1200))
+    left, top, right, bottom = camera.deadzone
+    camera.follow(_at(k, 600, 300), 1)
+    assert camera.x == pytest.approx(600 - right) and camera.ox == round(600 - right)
+    assert camera.visible.x == camera.ox and camera.sx == round(camera.x * k.VIEW_SCALE)
+    camera.follow(_at(k, 900, 1100), 1)
+    assert camera.y == 1200 - k.HEIGHT  # clamped to the level's bottom edge
+    camera.follow(_at(k, 5000, 0), 1)
+    assert (camera.x, camera.y) == (3200 - k.WIDTH, 0)
+
+
+def test_smoothing_eases_towards_the_goal(k):
+    camera = k.Camera((3200, 1200))
+    right = camera.deadzone[2]
+    camera.follow(_at(k, 1000, 300))
+    assert camera.x == pytest.approx((1000 - right) * k.CAMERA_SMOOTHING)
+    for _ in range(200):
+        camera.follow(_at(k, 1000, 300))
+    assert camera.x == pytest.approx(1000 - right)
+
+
+def test_apply_gives_backbuffer_positions(k):
+    camera = k.Camera((3200, 1200))
+    camera.move_to(400, 100)
+    assert camera.apply(k.pygame.Rect(480, 140, 32, 32)) == (40, 20)
@@ -0,0 +1,19 @@
+def test_capture_drops_frames_when_the_pool_is_full(k, tmp_path):
+    path = tmp_path / "run.raw"
+    path.write_bytes(b"old run")
+    size = (8, 6)
+    screen = k.pygame.Surface(size)
+    reads = []
+    def read(surf):
+        reads.append(surf)
+        return surf
+    capture = k.FrameCapture(str(path), size, pool=2)
+    # holding the writer's lock stalls it, so the pool never frees up
+    with capture.wake:
+        for _ in range(5):
+            capture.capture(screen, read)
+        assert capture.dropped == 3
+    capture.close()
+    assert (capture.frames, capture.written, len(reads)) == (5, 2, 2)
+    # a new capture replaces the file instead of appending to it
+    assert path.stat().st_size == 2 * 8 * 6 * 3
@@ -0,0 +1,32 @@
+SWEEP_GRID = [
+    "......",
+    "....#.",
+    "..----",
+    "######",
+]
+
+
+def test_sweep_x_stops_at_wall_without_tunneling(k):
+    cols, T = k.level_columns(SWEEP_GRID), k.TILE
+    assert k.sweep_x(cols, 4, 0, T, T, T, 10) == (10, False)
+    # a move far longer than a tile still stops at the first wall it enters
+    assert k.sweep_x(cols, 4, 0, T, T, T, 20 * T) == (3 * T, True)
+    assert k.sweep_x(cols, 4, 5 * T, T, T, T, -20 * T) == (5 * T, True)
+
+
+def test_sweep_y_one_way_platforms(k):
+    cols, T = k.level_columns(SWEEP_GRID), k.TILE
+    # falling onto a platform from above lands on it
+    assert k.sweep_y(cols, 4, 2 * T, 0, T, T, 3 * T) == (T, True)
+    # jumping up through it is not blocked
+    assert k.sweep_y(cols, 4, 2 * T, 3 * T - 4, T, T, -2 * T) == (T - 4, False)
+    # a body already overlapping the platform row falls through to the ground
+    assert k.sweep_y(cols, 4, 2 * T, 2 * T - 4, T, T, T) == (2 * T, True)
+    # solid tiles block from below
+    assert k.sweep_y(cols, 4, 4 * T, 2 * T + 8, T, T, -2 * T) == (2 * T, True)
+
+
+def test_fixed_point_sweeps_match_pixels(k):
+    cols, T, u = k.level_columns(SWEEP_GRID), k.TILE, 256
+    assert k.sweep_x(cols, 4, 0, T * u, T * u, T * u, 20 * T * u, T * u) == (3 * T * u, True)
+    assert k.sweep_y(cols, 4, 2 * T * u, 0, T * u, T * u, 3 * T * u, T * u) == (T * u, True)
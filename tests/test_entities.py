@@ -0,0 +1,34 @@
+def _level(k, *rows):
+    return k.Level(list(rows))
+
+
+def test_enemies_walk_between_walls_on_the_ground(k):
+    level = _level(k, "#E..#", "#####")
+    enemies, T = level.enemies, k.TILE
+    y0 = enemies.y[0]
+    speeds = set()
+    for _ in range(300):
+        enemies.update()
+        speeds.add(enemies.vx[0])
+        assert T <= enemies.x[0] <= 4 * T - enemies.w[0]
+    assert speeds == {-1.0, 1.0} and enemies.y[0] == y0 and len(enemies) == 1
+
+
+def test_enemies_land_on_platforms_and_die_below_the_level(k):
+    level = _level(k, "#E...#.K", "#.....#.", "#-----#.", "#.......")
+    enemies = level.enemies
+    for _ in range(120):
+        enemies.update()
+    # the goomba stands on the one-way platform; the koopa had none under it
+    assert len(enemies) == 1 and enemies.kind[0] == k.ENEMY_KINDS["E"][0]
+    assert enemies.y[0] + enemies.h[0] == 2 * k.TILE
+
+
+def test_stomp_only_kills_from_above(k):
+    level = _level(k, "..E..K", "######")
+    enemies = level.enemies
+    ex, ey = int(enemies.x[0]), int(enemies.y[0])
+    # from the side: overlapping, but the player's feet are below the middle
+    assert enemies.stomp(k.pygame.Rect(ex - 20, ey, 32, 32)) == 0
+    assert enemies.stomp(k.pygame.Rect(ex, ey - 28, 32, 32)) == 1
+    assert len(enemies) == 1 and enemies.kind[0] == k.ENEMY_KINDS["K"][0]
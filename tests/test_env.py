@@ -0,0 +1,46 @@
+import pytest
+
+
+def test_tile_observations(k):
+    env = k.KoopaEnv(rows=9, cols=17)
+    obs = env.reset()
+    assert obs.shape == (9, 17) and obs.dtype == k.np.uint8
+    assert (obs == k.OBS_PLAYER).sum() == 1
+    assert (obs[-1] == k.OBS_SOLID).any()
+    # hazards and one-way platforms get their own codes
+    env.game.load_level(["S.^.-...F", "#########"])
+    env._build_layer()
+    row = env._observe(env.obs)[-2]
+    assert k.OBS_HAZARD in row and k.OBS_PLATFORM in row and k.OBS_FLAG in row
+
+
+def test_seeded_resets_are_reproducible(k):
+    env = k.KoopaEnv()
+    first = env.reset(seed=5).copy()
+    assert env.game.level_obj.grid == k._random_level(60, k.random.Random(5))
+    assert (env.reset(seed=5) == first).all()
+
+
+def test_rewards_for_progress_coins_and_the_flag(k):
+    env = k.KoopaEnv()
+    env.reset()
+    game = env.game
+    x0 = game.player.rect.x
+    total, done = 0.0, False
+    for action in k.analyze_level(k.WORLD_DATA[0][0]):
+        _, reward, done = env.step(action)
+        total += reward
+    assert done
+    assert total == pytest.approx((game.player.rect.x - x0) / k.TILE + game.coins + 10)
+
+
+def test_falling_out_ends_the_episode(k):
+    env = k.KoopaEnv()
+    env.reset()
+    env.game.load_level(["S...", "#..."])
+    env._build_layer()
+    for _ in range(100):
+        _, reward, done = env.step(k.IN_RIGHT)
+        if done:
+            break
+    assert done and reward < -4
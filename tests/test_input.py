@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.fixture
+def post(k):
+    pygame = k.pygame
+    pygame.event.clear()
+
+    def post(kind, key):
+        pygame.event.post(pygame.event.Event(kind, key=key))
+    return post
+
+
+def test_poll_folds_keys_into_held_and_pressed(k, post):
+    pygame = k.pygame
+    state = k.InputState()
+    post(pygame.KEYDOWN, pygame.K_z)
+    assert state.poll() == k.IN_JUMP and state.pressed == k.IN_JUMP
+    assert state.poll() == k.IN_JUMP and state.pressed == 0
+    post(pygame.KEYUP, pygame.K_z)
+    assert state.poll() == 0
+    # a tap that starts and ends within one frame still counts for that frame
+    post(pygame.KEYDOWN, pygame.K_RIGHT)
+    post(pygame.KEYUP, pygame.K_RIGHT)
+    assert state.poll() == k.IN_RIGHT and state.pressed == k.IN_RIGHT
+    assert state.poll() == 0
+
+
+def test_rebind_replaces_the_keys_for_a_bit(k, post):
+    pygame = k.pygame
+    state = k.InputState()
+    state.rebind(k.IN_JUMP, [pygame.K_SPACE])
+    post(pygame.KEYDOWN, pygame.K_z)
+    assert state.poll() == 0
+    post(pygame.KEYDOWN, pygame.K_SPACE)
+    assert state.poll() == k.IN_JUMP
+    assert k.KEY_BINDINGS[pygame.K_z] == k.IN_JUMP  # the defaults are untouched
+
+
+def test_injected_source_replaces_only_gameplay_bits(k, post):
+    pygame = k.pygame
+    state = k.InputState()
+    state.inject([k.IN_RIGHT, k.IN_LEFT | k.IN_BACK])
+    post(pygame.KEYDOWN, pygame.K_ESCAPE)
+    post(pygame.KEYDOWN, pygame.K_z)
+    assert state.poll() == k.IN_RIGHT | k.IN_BACK
+    assert state.poll() == k.IN_LEFT | k.IN_BACK
+    # once the source runs out the devices drive play again
+    assert state.poll() == k.IN_JUMP | k.IN_BACK and state.source is None
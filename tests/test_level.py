@@ -0,0 +1,30 @@
+def test_tile_row_reads_unknown_characters_as_empty(k):
+    assert list(k.tile_row("#?é€x.")) == [k.TILE_IDS["#"], k.TILE_IDS["?"], 0, 0, 0, 0]
+
+
+def test_set_tile_bookkeeping(k):
+    level = k.Level(["..C.", "....", "####"])
+    coin, brick, air = k.COIN_TILE, k.TILE_IDS["B"], k.AIR
+    assert (2, 0) in level.coins
+    level.set_tile(2, 0, air, "collect")
+    assert (2, 0) not in level.coins and level.cols[2][0] == air
+    level.set_tile(1, 1, brick)
+    assert level.solid[1, 1] and level.floor[1, 1]
+    assert (brick, k.VIEW_TILE) in level.tile_cols[1]
+    level.set_tile(1, 1, brick)  # no-op
+    level.set_tile(0, 0, coin)
+    assert (0, 0) in level.coins
+    level.set_tile(1, 1, air)
+    assert not level.solid[1, 1] and level.tile_cols[1] == [(k.TILE_IDS["#"], 2 * k.VIEW_TILE)]
+    assert level.changes == [("collect", 2, 0, coin, air), ("set", 1, 1, air, brick),
+                             ("set", 0, 0, air, coin), ("set", 1, 1, brick, air)]
+
+
+def test_coin_columns_follow_edits(k):
+    level = k.Level(["C.C.", "C...", "####"])
+    assert [len(col) for col in level.coin_cols] == [2, 0, 1, 0]
+    level.collect_touching(level.coins[0, 0])
+    level.set_tile(3, 1, k.COIN_TILE)
+    assert level.coin_cols[0] == [level.coins[0, 1]]
+    assert level.coin_cols[3] == [level.coins[3, 1]]
+    assert sorted(level.coins) == [(0, 1), (2, 0), (3, 1)]
@@ -0,0 +1,49 @@
+import threading
+
+
+def test_take_hands_over_the_requested_level_once(k):
+    preload = k.Preloader()
+    grid = list(k.WORLD_DATA[0][0])
+    preload.request(grid)
+    level = preload.take(grid)
+    assert level is not None and level.grid is grid
+    assert preload.take(grid) is None
+    # an equal grid is a different request
+    preload.request(grid)
+    assert preload.take(list(grid)) is None
+
+
+def test_a_newer_request_replaces_the_pending_one(k):
+    preload = k.Preloader()
+    first, second = list(k.WORLD_DATA[0][0]), list(k.WORLD_DATA[0][1])
+    preload.request(first)
+    preload.request(second)
+    assert preload.take(first) is None
+    assert preload.take(second).grid is second
+
+
+def test_compiling_off_thread_builds_no_surfaces(k, monkeypatch):
+    made = []
+    surface = k.pygame.Surface
+    def spy(*args, **kwargs):
+        made.append(threading.current_thread().name)
+        return surface(*args, **kwargs)
+    monkeypatch.setattr(k.pygame, "Surface", spy)
+    preload = k.Preloader()
+    grid = list(k.WORLD_DATA[0][0])
+    preload.request(grid)
+    assert preload.take(grid) is not None and "preload" not in made
+
+
+def test_idle_warms_one_asset_per_call(k):
+    warmed = []
+    class Display:
+        def warm(self, asset):
+            warmed.append(asset)
+    preload = k.Preloader()
+    preload.request(None, k.GAME_ASSETS[:2])
+    preload.idle(Display())
+    assert len(warmed) == 1
+    preload.idle(Display())
+    preload.idle(Display())
+    assert len(warmed) == 2 and not preload.assets
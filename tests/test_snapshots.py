@@ -0,0 +1,41 @@
+import random
+
+
+def _state(game):
+    body, level = game.player.body, game.level_obj
+    return (body.x, body.y, body.vx, body.vy, body.on_ground, game.player.anim,
+            game.camera.x, game.camera.y, game.coins, game.tick,
+            b"".join(level.cols), sorted(level.coins), level.enemies.state(),
+            random.getstate())
+
+
+def test_snapshot_restore_is_deterministic(k):
+    game = k.GameEngine(headless=True)
+    rng = random.Random(2)
+    inputs = [rng.choice((0, k.IN_RIGHT, k.IN_RIGHT | k.IN_JUMP, k.IN_JUMP, k.IN_LEFT))
+              for _ in range(300)]
+    for held in inputs[:100]:
+        game.step(held)
+    blob = game.snapshot()
+    before = _state(game)
+    runs = []
+    for _ in range(2):
+        game.restore(blob)
+        assert _state(game) == before
+        states = []
+        for held in inputs[100:]:
+            if game.step(held) is not None:
+                game.restart()
+            states.append(_state(game))
+        runs.append(states)
+    assert runs[0] == runs[1]
+
+
+def test_restart_matches_a_fresh_load(k):
+    game = k.GameEngine(headless=True)
+    for _ in range(60):
+        game.step(k.IN_RIGHT | k.IN_JUMP)
+    game.restart()
+    restarted = _state(game)[:-1]
+    game.load_level()
+    assert _state(game)[:-1] == restarted
@@ -0,0 +1,21 @@
+def test_start_marker_wins(k):
+    T = k.TILE
+    grid = ["....", "..S.", "####"]
+    assert k.find_spawn(grid) == (2 * T, T)
+    # the marker itself is empty space, not a drawn or solid tile
+    level = k.Level(grid)
+    assert level.spawn == (2 * T, T) and not level.solid[1, 2]
+
+
+def test_spawn_needs_ground_and_headroom(k):
+    T = k.TILE
+    grid = ["#.....",
+            "#.....",
+            "..^...",
+            "#.#.-.",
+            "######"]
+    # column 0's only free cell over ground has a block right above it;
+    # column 1 has a free cell over ground with room above
+    assert k.find_spawn(grid) == (T, 3 * T)
+    assert k.find_spawn(["......", "......", "....-.", "#....."]) == (0, 2 * T)
+    assert k.find_spawn(["....", "...."]) == (2 * T, k.HEIGHT - 3 * T)